@@ -0,0 +1,178 @@
+"""Throughput, latency and memory of the real handlers under synthetic load.
+
+Drives search_movie_or_tv, handle_callback (result paging) and broadcast
+with fake Telegram updates against the local stubs in stubs.py, using
+mongomock or, with --mongo-uri, a throwaway database on a local mongod:
+
+    python benchmarks/bench_load.py --searches 2000 --concurrency 100 --latency 0.05
+    python benchmarks/bench_load.py --scenarios broadcast --broadcast-users 20000
+
+With --max-p95 the run exits non-zero when any scenario's p95 exceeds it,
+so it can gate a deploy.
+"""
+import argparse
+import asyncio
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import FakeCallbackQuery, FakeClient, FakeMessage, FakeUser, StubServers, load_bot, percentile, timed
+
+WORDS = ["titanic", "avatar", "inception", "dark", "knight", "star", "wars", "matrix", "alien",
+         "godfather", "jaws", "frozen", "joker", "gladiator", "heat", "up", "coco", "parasite"]
+
+
+def make_queries(count, seed=7):
+    """Query mix with a hot head (repeats) and a long tail of unique titles."""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        if rng.random() < 0.6:
+            queries.append(WORDS[min(int(rng.paretovariate(1.2)) - 1, len(WORDS) - 1)])
+        else:
+            queries.append(f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}")
+    return queries
+
+
+def rss_mb():
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_concurrently(coros, concurrency):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def one(coro):
+        async with slots:
+            return await timed(coro)
+
+    start = time.perf_counter()
+    samples = await asyncio.gather(*(one(coro) for coro in coros))
+    return samples, time.perf_counter() - start
+
+
+async def scenario_search(bot, client, args):
+    queries = make_queries(args.searches)
+    messages = [
+        FakeMessage(client, 100000 + i, query, from_user=FakeUser(100000 + i))
+        for i, query in enumerate(queries)
+    ]
+    return await run_concurrently((bot.search_movie_or_tv(client, m) for m in messages), args.concurrency)
+
+
+async def scenario_paginate(bot, client, args):
+    # Page forward through results the search scenario left in each chat
+    pages = []
+    for chat_id, message in list(client.last_sent.items()):
+        markup = message.reply_markup
+        if not markup:
+            continue
+        for row in markup.inline_keyboard:
+            for button in row:
+                if button.callback_data and button.callback_data.startswith("pg:"):
+                    pages.append((message, button.callback_data))
+    if not pages:
+        return [], 0.0
+    queries = [
+        FakeCallbackQuery(message, FakeUser(message.chat.id), data)
+        for message, data in (pages[i % len(pages)] for i in range(args.callbacks))
+    ]
+    return await run_concurrently((bot.handle_callback(client, q) for q in queries), args.concurrency)
+
+
+async def scenario_broadcast(bot, client, args):
+    bot.BROADCAST_RATE = args.broadcast_rate
+    bot.users.delete_many({})
+    for offset in range(0, args.broadcast_users, 10000):
+        bot.users.insert_many(
+            [{"user_id": 500000 + i, "username": f"user{i}", "last_seen": time.time()}
+             for i in range(offset, min(offset + 10000, args.broadcast_users))],
+            ordered=False
+        )
+    admin = FakeUser(bot.ADMIN_ID)
+    message = FakeMessage(client, admin.id, "/broadcast Load test announcement", from_user=admin)
+    sends_before = client.calls.get("send_message", 0)
+    start = time.perf_counter()
+    await bot.broadcast(client, message)
+    while bot.active_broadcasts:
+        await asyncio.sleep(0.05)
+    wall = time.perf_counter() - start
+    # Per-message latency is paced by the token bucket, so only throughput is meaningful
+    delivered = client.calls.get("send_message", 0) - sends_before - 1  # Minus the status reply to the admin
+    return [wall / max(delivered, 1)] * delivered, wall
+
+
+SCENARIOS = {
+    "search": scenario_search,
+    "paginate": scenario_paginate,
+    "broadcast": scenario_broadcast,
+}
+
+
+def report(name, samples, wall, memory):
+    if not samples:
+        print(f"{name:>10}: no operations")
+        return
+    print(f"{name:>10}: {len(samples)} ops in {wall:.2f}s = {len(samples) / wall:.0f} ops/s | "
+          f"p50={percentile(samples, 50) * 1000:.1f}ms p95={percentile(samples, 95) * 1000:.1f}ms "
+          f"p99={percentile(samples, 99) * 1000:.1f}ms | {memory}")
+
+
+async def main(args):
+    servers = await StubServers(latency=args.latency, results_per_search=args.results).start()
+    bot = load_bot(servers.base_url, mongo_uri=args.mongo_uri)
+    client = FakeClient(latency=args.telegram_latency)
+    await bot.load_genres()
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    print(f"stub_latency={args.latency * 1000:.0f}ms telegram_latency={args.telegram_latency * 1000:.0f}ms "
+          f"concurrency={args.concurrency} mongo={'mongod' if args.mongo_uri else 'mongomock'}")
+    regressions = []
+    try:
+        for name in args.scenarios.split(","):
+            requests_before = servers.requests
+            if args.tracemalloc:
+                tracemalloc.reset_peak()
+            samples, wall = await SCENARIOS[name](bot, client, args)
+            memory = f"rss_peak={rss_mb():.0f}MB upstream={servers.requests - requests_before}"
+            if args.tracemalloc:
+                memory += f" py_peak={tracemalloc.get_traced_memory()[1] / 2**20:.1f}MB"
+            report(name, samples, wall, memory)
+            if args.max_p95 and samples and name != "broadcast" and percentile(samples, 95) > args.max_p95 / 1000:
+                regressions.append(name)
+    finally:
+        await bot.analytics.drain()
+        await bot.close_http_session()
+        await servers.stop()
+
+    if args.stats:
+        print()
+        print(bot.format_stats())
+    if regressions:
+        print(f"p95 above {args.max_p95:.0f}ms in: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default="search,paginate,broadcast")
+    parser.add_argument("--searches", type=int, default=1000)
+    parser.add_argument("--callbacks", type=int, default=1000)
+    parser.add_argument("--broadcast-users", type=int, default=2000)
+    parser.add_argument("--broadcast-rate", type=float, default=1000, help="messages per second")
+    parser.add_argument("--concurrency", type=int, default=100, help="updates in flight at once")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub TMDb/Laravel latency in seconds")
+    parser.add_argument("--telegram-latency", type=float, default=0.01)
+    parser.add_argument("--results", type=int, default=10, help="results per stub search page")
+    parser.add_argument("--mongo-uri", help="use a throwaway database on this mongod instead of mongomock")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="also report peak Python heap per scenario (several times slower)")
+    parser.add_argument("--stats", action="store_true", help="print the bot's own /stats summary at the end")
+    parser.add_argument("--max-p95", type=float, help="fail if a scenario's p95 exceeds this many ms")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,46 @@
+"""p50/p99 latency of search_movie_or_tv under N concurrent simulated searches.
+
+Runs entirely against local stub servers (see stubs.py), e.g.:
+
+    python benchmarks/bench_search_latency.py --concurrency 200 --latency 0.05
+"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import FakeClient, FakeMessage, FakeUser, StubServers, load_bot, percentile, timed
+
+
+async def main(args):
+    servers = await StubServers(latency=args.latency).start()
+    bot = load_bot(servers.base_url)
+    client = FakeClient(latency=args.telegram_latency)
+    queries = ["titanic", "avatar", "inception", "dark knight", "interstellar"]
+
+    async def one(i):
+        user = FakeUser(1000 + i)
+        message = FakeMessage(client, user.id, queries[i % len(queries)], from_user=user)
+        return await timed(bot.search_movie_or_tv(client, message))
+
+    try:
+        start = asyncio.get_running_loop().time()
+        samples = await asyncio.gather(*(one(i) for i in range(args.concurrency)))
+        wall = asyncio.get_running_loop().time() - start
+    finally:
+        await bot.close_http_session()
+        await servers.stop()
+
+    print(f"concurrency={args.concurrency} stub_latency={args.latency * 1000:.0f}ms")
+    print(f"p50={percentile(samples, 50) * 1000:.1f}ms p99={percentile(samples, 99) * 1000:.1f}ms "
+          f"wall={wall:.2f}s upstream_requests={servers.requests}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub TMDb/Laravel latency in seconds")
+    parser.add_argument("--telegram-latency", type=float, default=0.01)
+    asyncio.run(main(parser.parse_args()))
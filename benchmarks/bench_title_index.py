@@ -0,0 +1,89 @@
+"""Build time, memory footprint, query latency and hit rate of the local title index.
+
+    python benchmarks/bench_title_index.py --titles 1000000
+
+recall@10 counts the target anywhere in the top ten. local counts the
+target among matches scoring at least TITLE_INDEX_MIN_SCORE, which is what
+the bot answers in-process for year-qualified and misspelled queries and
+moves to the front of TMDb's results otherwise; wrong counts confident
+matches that miss the target.
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import load_bot, percentile
+
+WORDS = (
+    "the dark night knight last first lost city love war star dead man woman house of blood "
+    "king queen return rise fall secret world game girl boy river road home shadow fire ice "
+    "storm legend story dragon ghost empire iron silent wild heart dream black white red blue "
+    "golden summer winter mountain ocean island journey escape hunter family brother sister"
+).split()
+
+
+def synthetic_title(rng):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))) + f" {rng.randint(1, 99999)}"
+
+
+def typo(rng, text):
+    i = rng.randrange(len(text))
+    return text[:i] + text[i + 1:]
+
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(args):
+    bot = load_bot("http://127.0.0.1:1")
+    rng = random.Random(42)
+    titles = [synthetic_title(rng) for _ in range(args.titles)]
+
+    # Zipf-like popularity: a few titles get most of the searches
+    popularity = [1000.0 / (rank + 1) for rank in range(args.titles)]
+    rng.shuffle(popularity)
+    hot = sorted(range(args.titles), key=popularity.__getitem__, reverse=True)[:args.hot]
+
+    before = rss_mb()
+    start = time.perf_counter()
+    index = bot.TitleIndex()
+    for i, title in enumerate(titles):
+        index.add("tv" if i % 3 == 0 else "movie", i, title, year=1950 + i % 75, popularity=popularity[i], bulk=True)
+    index.sort_postings()
+    build = time.perf_counter() - start
+    print(f"built {len(index)} titles in {build:.1f}s, peak RSS grew by {rss_mb() - before:.0f} MB")
+
+    for label, targets, make_query in (
+        ("hot exact", hot, lambda t: t),
+        ("hot typo", hot, lambda t: typo(rng, t)),
+        ("hot prefix", hot, lambda t: t[:max(4, len(t) * 2 // 3)]),
+        ("any exact", range(args.titles), lambda t: t),
+    ):
+        latencies = []
+        found = local = wrong = 0
+        for _ in range(args.queries):
+            target = rng.choice(targets)
+            query = make_query(titles[target])
+            start = time.perf_counter()
+            results = index.search(query, limit=10)
+            latencies.append(time.perf_counter() - start)
+            found += any(record["id"] == target for _, record in results)
+            confident = [record["id"] for score, record in results if score >= bot.TITLE_INDEX_MIN_SCORE]
+            local += target in confident
+            wrong += bool(confident) and target not in confident
+        print(f"{label:>10}: p50={percentile(latencies, 50) * 1000:.3f}ms p99={percentile(latencies, 99) * 1000:.3f}ms "
+              f"recall@10={found / args.queries:.0%} local={local / args.queries:.0%} wrong={wrong / args.queries:.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--titles", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--hot", type=int, default=1000, help="number of most popular titles queried as hot")
+    main(parser.parse_args())
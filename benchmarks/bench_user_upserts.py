@@ -0,0 +1,74 @@
+"""Upsert latency on the users collection with and without ensure_indexes().
+
+Needs a local mongod for meaningful numbers; --mongomock runs the same steps
+in-process (mongomock always scans, so it only checks the bootstrap works):
+
+    python benchmarks/bench_user_upserts.py --users 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stubs import load_bot, percentile
+
+
+def measure(collection, total_users, samples):
+    latencies = []
+    for _ in range(samples):
+        user_id = random.randrange(total_users)
+        start = time.perf_counter()
+        collection.update_one({"user_id": user_id}, {"$set": {"last_seen": time.time()}}, upsert=True)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def report(label, latencies):
+    print(f"{label:>14}: p50={percentile(latencies, 50) * 1000:.2f}ms "
+          f"p99={percentile(latencies, 99) * 1000:.2f}ms")
+
+
+def main(args):
+    bot = load_bot("http://127.0.0.1:1")
+    if args.mongomock:
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(args.uri, serverSelectionTimeoutMS=2000)
+        client.server_info()
+
+    client.drop_database(args.database)
+    bench_db = client[args.database]
+    bot.db = bench_db
+    bot.users = bench_db["users"]
+
+    start = time.perf_counter()
+    for offset in range(0, args.users, 10000):
+        bot.users.insert_many(
+            [{"user_id": i, "username": f"user{i}", "last_seen": time.time()}
+             for i in range(offset, min(offset + 10000, args.users))],
+            ordered=False
+        )
+    print(f"inserted {args.users} synthetic users in {time.perf_counter() - start:.1f}s")
+
+    report("without index", measure(bot.users, args.users, args.samples))
+    start = time.perf_counter()
+    missing = bot.ensure_indexes()
+    print(f"ensure_indexes took {time.perf_counter() - start:.1f}s, still missing: {missing or 'none'}")
+    report("with index", measure(bot.users, args.users, args.samples))
+
+    client.drop_database(args.database)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uri", default=os.getenv("MONGO_BENCH_URI", "mongodb://127.0.0.1:27017"))
+    parser.add_argument("--database", default="movie_bot_bench")
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--samples", type=int, default=500)
+    parser.add_argument("--mongomock", action="store_true", help="use mongomock instead of a local mongod")
+    main(parser.parse_args())
@@ -0,0 +1,284 @@
+"""Local stand-ins for TMDb, the Laravel site, Telegram and MongoDB.
+
+Benchmarks import the real bot module through ``load_bot`` so the handlers
+under test are exactly the ones that ship, only pointed at these stubs.
+"""
+import asyncio
+import importlib
+import itertools
+import os
+import sys
+import time
+
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def fake_result(media_type, tmdb_id, query):
+    title_key = "title" if media_type == "movie" else "name"
+    date_key = "release_date" if media_type == "movie" else "first_air_date"
+    return {
+        "id": tmdb_id,
+        title_key: f"{query.title()} {tmdb_id}",
+        date_key: f"{1990 + tmdb_id % 35}-01-01",
+        "poster_path": f"/poster{tmdb_id}.jpg",
+        "genre_ids": [18, 28],
+        "popularity": 1000.0 / (1 + tmdb_id % 50),
+    }
+
+
+class StubServers:
+    """aiohttp app serving fake TMDb and Laravel endpoints with fixed latency."""
+
+    def __init__(self, latency=0.05, results_per_search=10):
+        self.latency = latency
+        self.results_per_search = results_per_search
+        self.requests = 0
+        self.runner = None
+        self.base_url = None
+
+    async def _delay(self):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def search(self, request):
+        await self._delay()
+        media_type = request.match_info["media_type"]
+        query = request.query.get("query", "")
+        page = int(request.query.get("page", 1))
+        offset = 0 if media_type == "movie" else 500
+        seed = sum(map(ord, query)) % 1000 * 1000 + offset + (page - 1) * self.results_per_search
+        results = [fake_result(media_type, seed + i, query) for i in range(self.results_per_search)]
+        return web.json_response({"page": page, "results": results, "total_pages": 3})
+
+    async def details(self, request):
+        await self._delay()
+        media_type = request.match_info["media_type"]
+        tmdb_id = int(request.match_info["tmdb_id"])
+        data = fake_result(media_type, tmdb_id, "title")
+        data["genres"] = [{"id": 18, "name": "Drama"}, {"id": 28, "name": "Action"}]
+        return web.json_response(data)
+
+    async def listing(self, request):
+        await self._delay()
+        media_type = request.match_info.get("media_type", "movie")
+        results = [dict(fake_result(media_type, i, "trending"), media_type=media_type) for i in range(20)]
+        return web.json_response({"page": 1, "results": results, "total_pages": 1})
+
+    async def genres(self, request):
+        await self._delay()
+        return web.json_response({"genres": [{"id": 18, "name": "Drama"}, {"id": 28, "name": "Action"}]})
+
+    async def laravel(self, request):
+        await self._delay()
+        return web.json_response({"status": "ok"})
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/3/search/{media_type}", self.search)
+        app.router.add_get("/3/genre/{media_type}/list", self.genres)
+        app.router.add_get("/3/trending/all/day", self.listing)
+        app.router.add_get("/3/{media_type}/popular", self.listing)
+        app.router.add_get("/3/movie/now_playing", self.listing)
+        app.router.add_get("/3/{media_type}/{tmdb_id:\\d+}", self.details)
+        app.router.add_post("/api", self.laravel)
+        app.router.add_post("/api/{tail:.*}", self.laravel)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self
+
+    async def stop(self):
+        if self.runner:
+            await self.runner.cleanup()
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.first_name = f"User{user_id}"
+        self.username = f"user{user_id}"
+
+
+class FakeChat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+
+_message_ids = itertools.count(1)
+
+
+class FakeMessage:
+    def __init__(self, client, chat_id, text=None, from_user=None):
+        self.client = client
+        self.id = next(_message_ids)
+        self.chat = FakeChat(chat_id)
+        self.text = text
+        self.caption = None
+        self.from_user = from_user
+        self.reply_to_message = None
+        self.reply_markup = None
+        self.photo = self.video = self.document = None
+        self.command = text.split() if text and text.startswith("/") else None
+
+    async def reply(self, text, **kwargs):
+        return await self.client.send_message(self.chat.id, text, **kwargs)
+
+    async def edit(self, text, **kwargs):
+        await self.client._call("edit_message_text")
+        self.text = text
+        return self
+
+    edit_text = edit
+
+    async def edit_caption(self, caption, **kwargs):
+        await self.client._call("edit_message_caption")
+        return self
+
+    async def edit_media(self, media, **kwargs):
+        await self.client._call("edit_message_media")
+        return self
+
+    async def edit_reply_markup(self, reply_markup=None):
+        await self.client._call("edit_message_reply_markup")
+        return self
+
+    async def delete(self):
+        await self.client._call("delete_messages")
+
+
+class FakeCallbackQuery:
+    def __init__(self, message, user, data):
+        self.id = str(next(_message_ids))
+        self.message = message
+        self.from_user = user
+        self.data = data
+
+    async def answer(self, text=None, show_alert=False, **kwargs):
+        await self.message.client._call("answer_callback_query")
+
+
+class FakePhoto:
+    def __init__(self, file_id):
+        self.file_id = file_id
+
+
+class FakeClient:
+    """Records every Telegram API call and simulates its network latency."""
+
+    def __init__(self, latency=0.01):
+        self.latency = latency
+        self.calls = {}
+        self.last_sent = {}  # chat_id -> last message sent there
+
+    def _sent(self, message, reply_markup=None):
+        message.reply_markup = reply_markup
+        self.last_sent[message.chat.id] = message
+        return message
+
+    async def _call(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call("send_message")
+        return self._sent(FakeMessage(self, chat_id, text), kwargs.get("reply_markup"))
+
+    async def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        await self._call("send_photo")
+        message = FakeMessage(self, chat_id)
+        message.caption = caption
+        message.photo = FakePhoto(f"file-{abs(hash(photo))}")
+        return self._sent(message, kwargs.get("reply_markup"))
+
+    async def send_video(self, chat_id, video, **kwargs):
+        await self._call("send_video")
+        return FakeMessage(self, chat_id)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        await self._call("send_document")
+        return FakeMessage(self, chat_id)
+
+    async def send_chat_action(self, chat_id, action):
+        await self._call("send_chat_action")
+
+    async def edit_message_media(self, chat_id, message_id, media, **kwargs):
+        await self._call("edit_message_media")
+        message = FakeMessage(self, chat_id)
+        message.caption = media.caption
+        message.photo = FakePhoto(f"file-{abs(hash(media.media))}")
+        return self._sent(message, kwargs.get("reply_markup"))
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        await self._call("edit_message_text")
+
+    async def edit_message_reply_markup(self, chat_id, message_id, reply_markup=None):
+        await self._call("edit_message_reply_markup")
+
+    async def answer_inline_query(self, inline_query_id, results, **kwargs):
+        await self._call("answer_inline_query")
+
+
+def load_bot(base_url, mongo_uri=None, database="movie_bot_bench"):
+    """Import bot.py against the stub servers.
+
+    Collections come from mongomock, or from a throwaway database on a real
+    mongod when mongo_uri is given.
+    """
+    os.environ.update({
+        "BOT_TOKEN": "0:stub",
+        "API_ID": "1",
+        "API_HASH": "stub",
+        "TMDB_API_KEY": "stub",
+        "LARAVEL_API_TOKEN": "stub",
+        "MONGO_URI": "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100",
+        "TMDB_API_URL": f"{base_url}/3",
+        "LARAVEL_API_URL": f"{base_url}/api",
+        "LOG_SEARCH_URL": f"{base_url}/api/log-search",
+    })
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    bot = importlib.import_module("bot")
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri, serverSelectionTimeoutMS=2000)
+        client.drop_database(database)
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+    bench_db = client[database]
+    bot.mongo = client
+    bot.db = bench_db
+    bot.users = bench_db["users"]
+    bot.searches = bench_db["searches"]
+    bot.tmdb_cache_collection = bench_db["tmdb_cache"]
+    bot.broadcast_jobs = bench_db["broadcast_jobs"]
+    bot.search_sessions = bench_db["search_sessions"]
+    bot.poster_files = bench_db["poster_files"]
+    if isinstance(bot.sessions, bot.MongoSessionStore):
+        bot.sessions = bot.MongoSessionStore(bot.search_sessions)
+    bot.site_connected = True
+    # Skip the boot sequence: handlers would otherwise answer "starting up"
+    bot.health.status["site"] = {"ok": True, "latency": 0.0, "checked_at": time.time(), "detail": "stub"}
+    bot.readiness.update(mongo=True, genres=True)
+    return bot
+
+
+async def timed(coro):
+    start = time.perf_counter()
+    await coro
+    return time.perf_counter() - start
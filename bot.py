@@ -1,19 +1,42 @@
 from pyrogram import Client, filters, idle
-from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
-from tmdbv3api import TMDb, Movie, TV
-from tmdbv3api.exceptions import TMDbException
-from pymongo import MongoClient
+from pyrogram.errors import FloodWait, UserIsBlocked, ChatInvalid, UserDeactivated, InputUserDeactivated
+from pyrogram.errors import FileIdInvalid, FileReferenceExpired, FileReferenceInvalid, MediaEmpty
+from pyrogram.errors import MessageNotModified
+from pyrogram.enums import ChatAction
+from pyrogram.types import (
+    InlineKeyboardButton, InlineKeyboardMarkup, InlineQueryResultArticle, InlineQueryResultCachedPhoto,
+    InlineQueryResultPhoto, InputMediaPhoto, InputTextMessageContent, Message
+)
+from pyrogram.handlers import CallbackQueryHandler, InlineQueryHandler, MessageHandler
+from pymongo import MongoClient, DeleteOne, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from bson import ObjectId
+from concurrent.futures import ThreadPoolExecutor
+from array import array
+from collections import Counter, OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from flask import Flask, Response
+from werkzeug.serving import make_server
+import aiohttp
+import contextlib
+import contextvars
+import functools
 import logging
-import requests
 import time
 import socket
-import sys
-import threading
 import os
+import gzip
+import json
 import re
+import secrets
+import unicodedata
 import asyncio
+import bisect
+import threading
 from dotenv import load_dotenv
 
+BOOT_STARTED = time.monotonic()  # Reference point for the startup metrics
+
 # Load environment variables
 load_dotenv()
 
@@ -22,10 +45,91 @@ logging.basicConfig(level=logging.INFO, filename='bot.log', format='%(asctime)s
 
 # MongoDB Setup
 MONGO_URI = os.getenv("MONGO_URI")
-mongo = MongoClient(MONGO_URI)
+# connect=False defers all networking to the first operation, and the short
+# selection timeout keeps an unreachable server from tying up db_executor
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", 5000))
+mongo = MongoClient(MONGO_URI, connect=False, serverSelectionTimeoutMS=MONGO_TIMEOUT_MS)
 db = mongo["movie_bot"]
 searches = db["searches"]
 users = db["users"]  # Collection for storing user data
+tmdb_cache_collection = db["tmdb_cache"]  # Shared second tier of the TMDb response cache
+broadcast_jobs = db["broadcast_jobs"]  # Broadcast job state and progress checkpoints
+search_sessions = db["search_sessions"]  # Search sessions when SESSION_BACKEND=mongo
+poster_files = db["poster_files"]  # Image URL -> Telegram file_id of an already delivered copy
+leases = db["leases"]  # Scale-out: which worker runs each singleton job
+update_claims = db["update_claims"]  # Scale-out: which worker handles each Telegram update
+bot_state = db["bot_state"]  # Scale-out: health status published by the leader
+
+# Schema bootstrap: indexes every collection relies on, as
+# collection -> [(name, keys, options)]
+REQUIRED_INDEXES = {
+    "users": [
+        ("user_id_unique", [("user_id", ASCENDING)], {"unique": True}),
+        ("last_seen", [("last_seen", DESCENDING)], {}),
+    ],
+    "searches": [
+        ("created_at", [("created_at", DESCENDING)], {}),
+        ("user_id_created_at", [("user_id", ASCENDING), ("created_at", DESCENDING)], {}),
+    ],
+    "tmdb_cache": [
+        ("expires_at_ttl", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "broadcast_jobs": [
+        ("status", [("status", ASCENDING)], {}),
+    ],
+    "search_sessions": [
+        ("expires_at_ttl", [("expires_at", ASCENDING)], {"expireAfterSeconds": 0}),
+    ],
+    "update_claims": [
+        ("created_at_ttl", [("created_at", ASCENDING)], {"expireAfterSeconds": 3600}),
+    ],
+}
+
+def check_indexes():
+    """Return the required indexes that are missing, as "collection.name" strings."""
+    missing = []
+    for collection_name, specs in REQUIRED_INDEXES.items():
+        existing = db[collection_name].index_information()
+        for name, keys, options in specs:
+            matches = [info for info in existing.values() if list(info["key"]) == keys]
+            if not any(info.get("unique", False) == options.get("unique", False) for info in matches):
+                missing.append(f"{collection_name}.{name}")
+    return missing
+
+def dedupe_users():
+    """Keep only the most recently seen document per user_id."""
+    duplicates = users.aggregate([
+        {"$sort": {"last_seen": -1}},
+        {"$group": {"_id": "$user_id", "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True)
+    extra_ids = [doc_id for group in duplicates for doc_id in group["ids"][1:]]
+    if extra_ids:
+        users.delete_many({"_id": {"$in": extra_ids}})
+    return len(extra_ids)
+
+def ensure_indexes():
+    """Create any missing required index and return the ones that are still missing."""
+    to_create = set(check_indexes())
+    for collection_name, specs in REQUIRED_INDEXES.items():
+        for name, keys, options in specs:
+            if f"{collection_name}.{name}" not in to_create:
+                continue
+            try:
+                db[collection_name].create_index(keys, name=name, **options)
+            except OperationFailure as e:
+                if e.code == 11000 and collection_name == "users":
+                    removed = dedupe_users()
+                    logging.warning(f"Removed {removed} duplicate user documents before creating {name}")
+                    db[collection_name].create_index(keys, name=name, **options)
+                else:
+                    logging.error(f"Could not create index {collection_name}.{name}: {e}")
+                    continue
+            logging.info(f"Created index {collection_name}.{name}")
+    missing = check_indexes()
+    if missing:
+        logging.error(f"Missing MongoDB indexes: {', '.join(missing)}")
+    return missing
 
 # Admin Telegram ID
 ADMIN_ID = 6133440326
@@ -35,115 +139,1367 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 API_ID = int(os.getenv("API_ID"))
 API_HASH = os.getenv("API_HASH")
 BOT_NAME = "DD_search_movie_bot"
+TG_WORKERS = int(os.getenv("TG_WORKERS", Client.WORKERS))  # Updates handled concurrently per process
+
+# Scale-out: with SCALE_OUT=1 several processes (e.g. Heroku worker dynos)
+# serve the bot together; each needs its own WORKER_ID for its session file.
+# Whichever worker claims an update first handles it, so admission control
+# (TMDB_CONCURRENCY, SEARCH_RATE/SEARCH_BURST, one search in flight per user)
+# is enforced per worker, not across the fleet
+SCALE_OUT = os.getenv("SCALE_OUT") == "1"
+WORKER_ID = os.getenv("WORKER_ID") or os.getenv("DYNO") or socket.gethostname()
+WORKER_NAME = f"{WORKER_ID}:{os.getpid()}"  # Lease holder identity, unique per process
 
 # Laravel API Configuration
 LARAVEL_API_TOKEN = os.getenv("LARAVEL_API_TOKEN")
-LARAVEL_API_URL = "https://hindicinema.xyz/api"
-search_results = {}
+LARAVEL_API_URL = os.getenv("LARAVEL_API_URL", "https://hindicinema.xyz/api")
+LOG_SEARCH_URL = os.getenv("LOG_SEARCH_URL", "https://api.hindicinema.xyz/api/log-search")
+# Optional endpoint accepting {"searches": [...]}; without it events are posted one by one
+LOG_SEARCH_BULK_URL = os.getenv("LOG_SEARCH_BULK_URL")
+
+# Metrics: counters and latency histograms for handlers and every external
+# call (TMDb, Laravel, Mongo, Telegram), summarised by /stats and served in
+# the Prometheus text format on METRICS_PORT when it is set
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class Histogram:
+    """Latency histogram over LATENCY_BUCKETS, plus an overflow bucket."""
+
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+class Metrics:
+    """In-process registry of labelled counters and latency histograms."""
+
+    def __init__(self, prefix="moviebot"):
+        self.prefix = prefix
+        self.started = time.time()
+        self.counters = Counter()
+        self.histograms = {}
+        self.collectors = {}
+        self.gauges = {}
+
+    def inc(self, name, amount=1, **labels):
+        self.counters[name, tuple(sorted(labels.items()))] += amount
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Time the block into histogram name, labelled with its outcome."""
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, outcome=outcome, **labels)
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def collect(self, name, func):
+        """Expose counts kept elsewhere; func returns {label value: count} under label "kind"."""
+        self.collectors[name] = func
+
+    def collected(self):
+        for name, func in list(self.collectors.items()):
+            try:
+                values = func()
+            except Exception as e:
+                logging.debug(f"Metrics collector {name} failed: {e}")
+                continue
+            for kind, value in values.items():
+                yield (name, (("kind", kind),)), value
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {self.prefix}_{name} {kind}")
+
+        counters = sorted(list(self.counters.items()) + list(self.collected()), key=lambda item: item[0])
+        for (name, labels), value in counters:
+            declare(name, "counter")
+            lines.append(f"{self.prefix}_{name}{format_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(list(self.histograms.items()), key=lambda item: item[0]):
+            declare(name, "histogram")
+            counts = list(histogram.counts)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.prefix}_{name}_bucket{format_labels(labels, le=bound)} {cumulative}")
+            lines.append(f"{self.prefix}_{name}_sum{format_labels(labels)} {histogram.sum:.6f}")
+            lines.append(f"{self.prefix}_{name}_count{format_labels(labels)} {histogram.count}")
+        gauges = dict(self.gauges, uptime_seconds=time.time() - self.started)
+        for name, value in sorted(gauges.items()):
+            lines.append(f"# TYPE {self.prefix}_{name} gauge")
+            lines.append(f"{self.prefix}_{name} {value:.3f}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+
+def instrumented(name):
+    """Record the latency and failures of a handler or page operation."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            try:
+                with metrics.timer("handler_seconds", handler=name):
+                    result = await func(*args, **kwargs)
+            except Exception:
+                metrics.inc("handler_errors_total", handler=name)
+                raise
+            if "startup_first_reply_seconds" not in metrics.gauges:
+                # Only handlers answering an update count, not background sends
+                first_reply = time.monotonic() - BOOT_STARTED
+                metrics.set_gauge("startup_first_reply_seconds", first_reply)
+                logging.info(f"⏱ First reply sent {first_reply:.1f}s after launch")
+            return result
+        return wrapper
+    return decorator
+
+def start_metrics_server(host, port):
+    """Serve /metrics from a daemon thread; reads are lock-free snapshots."""
+    metrics_app = Flask("movie_bot_metrics")
+
+    @metrics_app.route("/metrics")
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    server = make_server(host, port, metrics_app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.info(f"📈 Metrics available on http://{host}:{port}/metrics")
+    return server
+
+# Pyrogram sleeps through FloodWaits up to sleep_threshold inside invoke();
+# paced bulk senders set this so every wait reaches their limiter instead
+raise_flood_waits = contextvars.ContextVar("raise_flood_waits", default=False)
+
+@contextlib.contextmanager
+def raising_flood_waits():
+    token = raise_flood_waits.set(True)
+    try:
+        yield
+    finally:
+        raise_flood_waits.reset(token)
+
+class InstrumentedClient(Client):
+    """Client whose every Telegram API call is timed and FloodWaits counted."""
+
+    async def invoke(self, query, *args, **kwargs):
+        method = type(query).__name__
+        if raise_flood_waits.get():
+            kwargs["sleep_threshold"] = 0
+        try:
+            with metrics.timer("telegram_request_seconds", method=method):
+                return await super().invoke(query, *args, **kwargs)
+        except FloodWait:
+            metrics.inc("flood_waits_total", method=method)
+            raise
 
 # Pyrogram Client
-app = Client(
-    "movie_bot",
+app = InstrumentedClient(
+    f"movie_bot_{WORKER_ID}" if SCALE_OUT else "movie_bot",
     bot_token=BOT_TOKEN,
     api_id=API_ID,
-    api_hash=API_HASH
+    api_hash=API_HASH,
+    workers=TG_WORKERS
 )
 
 # TMDB setup
-tmdb = TMDb()
-tmdb.api_key = os.getenv("TMDB_API_KEY")
-tmdb.language = "en"
-movie = Movie()
-tv = TV()
+TMDB_API_KEY = os.getenv("TMDB_API_KEY")
+TMDB_API_URL = os.getenv("TMDB_API_URL", "https://api.themoviedb.org/3")
+TMDB_LANGUAGE = "en"
+
+# Async I/O: one shared aiohttp session for TMDb/Laravel, and a bounded
+# thread pool so blocking pymongo calls never run on the event loop
+http_session = None
+db_executor = ThreadPoolExecutor(max_workers=int(os.getenv("DB_WORKERS", 8)), thread_name_prefix="mongo")
+
+class TMDbError(Exception):
+    pass
+
+class TMDbOverloaded(TMDbError):
+    """TMDb work shed because too many requests are already waiting."""
+
+# Process-wide cap on concurrent TMDb requests: a bounded queue waits for a
+# slot, anything beyond it (or waiting longer than TMDB_QUEUE_TIMEOUT) is shed.
+# With SCALE_OUT every worker has its own gate, so divide the fleet's TMDb
+# budget by the worker count when setting TMDB_CONCURRENCY
+TMDB_CONCURRENCY = int(os.getenv("TMDB_CONCURRENCY", 20))
+TMDB_MAX_QUEUE = int(os.getenv("TMDB_MAX_QUEUE", 200))
+TMDB_QUEUE_TIMEOUT = float(os.getenv("TMDB_QUEUE_TIMEOUT", 5))
+# Streaming later result pages and prefetching run behind their own smaller
+# gate, so they never take slots or queue places from searches users wait on
+TMDB_BACKGROUND_CONCURRENCY = int(os.getenv("TMDB_BACKGROUND_CONCURRENCY", 4))
+
+class AdmissionGate:
+    """Async context manager capping concurrent work, queueing or shedding the excess."""
+
+    def __init__(self, limit, max_queue, timeout):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.waiting = 0
+        self.stats = {"admitted": 0, "queued": 0, "shed": 0}
+
+    async def __aenter__(self):
+        if self.semaphore.locked():
+            if self.waiting >= self.max_queue:
+                self.stats["shed"] += 1
+                raise TMDbOverloaded(f"{self.waiting} requests already queued")
+            self.stats["queued"] += 1
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                self.stats["shed"] += 1
+                raise TMDbOverloaded(f"No free slot within {self.timeout}s") from None
+            finally:
+                self.waiting -= 1
+        else:
+            await self.semaphore.acquire()
+        self.stats["admitted"] += 1
+
+    async def __aexit__(self, *exc_info):
+        self.semaphore.release()
+
+tmdb_gate = AdmissionGate(TMDB_CONCURRENCY, TMDB_MAX_QUEUE, TMDB_QUEUE_TIMEOUT)
+tmdb_background_gate = AdmissionGate(TMDB_BACKGROUND_CONCURRENCY, TMDB_MAX_QUEUE, TMDB_QUEUE_TIMEOUT)
+metrics.collect("tmdb_admission_total", lambda: tmdb_gate.stats)
+metrics.collect("tmdb_background_admission_total", lambda: tmdb_background_gate.stats)
+
+# Set for TMDb work nobody is waiting on; tasks created inside inherit it
+tmdb_background = contextvars.ContextVar("tmdb_background", default=False)
+
+@contextlib.contextmanager
+def background_tmdb():
+    token = tmdb_background.set(True)
+    try:
+        yield
+    finally:
+        tmdb_background.reset(token)
+
+def get_http_session():
+    global http_session
+    if http_session is None or http_session.closed:
+        http_session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=15))
+    return http_session
+
+async def close_http_session():
+    if http_session is not None and not http_session.closed:
+        await http_session.close()
+
+async def run_db(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    with metrics.timer("mongo_call_seconds", op=getattr(func, "__name__", "call")):
+        return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
+
+async def tmdb_request(path, **params):
+    params = {"api_key": TMDB_API_KEY, "language": TMDB_LANGUAGE, **params}
+    async with tmdb_background_gate if tmdb_background.get() else tmdb_gate:
+        # Ids are folded out of the label so details lookups share one series
+        with metrics.timer("tmdb_request_seconds", endpoint=re.sub(r"/\d+", "/{id}", path)):
+            try:
+                async with get_http_session().get(f"{TMDB_API_URL}{path}", params=params) as response:
+                    data = await response.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                raise TMDbError(f"Request to {path} failed: {e}") from e
+            if response.status != 200 or not isinstance(data, dict) or data.get("success") is False:
+                message = data.get("status_message") if isinstance(data, dict) else None
+                raise TMDbError(message or f"HTTP {response.status}")
+            return data
+
+# TMDb response cache: in-process LRU in front of a shared Mongo tier
+TMDB_CACHE_SIZE = int(os.getenv("TMDB_CACHE_SIZE", 5000))
+TMDB_CACHE_TTL = int(os.getenv("TMDB_CACHE_TTL", 6 * 3600))
+
+class TTLCache:
+    """Size-bounded LRU mapping whose entries expire after a TTL."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._data[key] = (time.time() + (ttl or self.ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return entry[1] if entry else default
+
+    def __len__(self):
+        return len(self._data)
+
+tmdb_cache = TTLCache(TMDB_CACHE_SIZE, TMDB_CACHE_TTL)
+cache_stats = {"memory_hits": 0, "mongo_hits": 0, "misses": 0}
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+def _store_cache_entry(key, value, expires_at):
+    try:
+        tmdb_cache_collection.update_one(
+            {"_id": key},
+            {"$set": {"value": value, "expires_at": expires_at}},
+            upsert=True
+        )
+    except Exception as e:
+        logging.warning(f"Failed to persist TMDb cache entry {key}: {e}")
+
+class SingleFlight:
+    """Lets concurrent callers asking for the same key share one in-flight call."""
+
+    def __init__(self):
+        self.calls = {}
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def _done(self, key, future):
+        self.calls.pop(key, None)
+        if not future.cancelled():
+            future.exception()  # Mark as retrieved even if every waiter gave up
+
+    async def do(self, key, func):
+        future = self.calls.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["calls"] += 1
+            future = asyncio.ensure_future(func())
+            self.calls[key] = future
+            future.add_done_callback(functools.partial(self._done, key))
+        # Shielded so one caller timing out doesn't cancel the call for the others
+        return await asyncio.shield(future)
+
+tmdb_flights = SingleFlight()
+metrics.collect("tmdb_cache_lookups_total", lambda: cache_stats)
+metrics.collect("tmdb_singleflight_total", lambda: tmdb_flights.stats)
+
+async def cached_tmdb(key, fetch):
+    value = tmdb_cache.get(key)
+    if value is not None:
+        cache_stats["memory_hits"] += 1
+        return value
+    return await tmdb_flights.do(key, lambda: _load_tmdb(key, fetch))
+
+async def _load_tmdb(key, fetch):
+    now = datetime.now(timezone.utc)
+    # With Mongo down the shared tier is skipped rather than waited on
+    use_mongo = mongo_available()
+    doc = None
+    if use_mongo:
+        try:
+            doc = await run_db(tmdb_cache_collection.find_one, {"_id": key, "expires_at": {"$gt": now}})
+        except Exception as e:
+            logging.warning(f"TMDb cache lookup failed for {key}: {e}")
+    if doc:
+        cache_stats["mongo_hits"] += 1
+        expires_at = doc["expires_at"].replace(tzinfo=timezone.utc)
+        tmdb_cache.set(key, doc["value"], ttl=(expires_at - now).total_seconds())
+        return doc["value"]
+
+    cache_stats["misses"] += 1
+    value = await fetch()
+    tmdb_cache.set(key, value)
+    # Persisting is fire-and-forget so a miss never waits on Mongo twice
+    if use_mongo:
+        db_executor.submit(_store_cache_entry, key, value, now + timedelta(seconds=TMDB_CACHE_TTL))
+    return value
+
+def search_cache_key(media_type, query, page=1):
+    return f"search:{media_type}:{page}:{normalize_query(query)}"
+
+async def tmdb_search(media_type, query, page=1):
+    """One page of search results as {"results": [...], "total_pages": n}."""
+    # Year filtering happens locally, so one entry serves every year variant of a query
+    async def fetch():
+        data = await tmdb_request(f"/search/{media_type}", query=query, page=page)
+        results = data.get("results", [])
+        title_index.add_results(media_type, results)
+        return {"results": results, "total_pages": data.get("total_pages", 1)}
+    return await cached_tmdb(search_cache_key(media_type, query, page), fetch)
+
+async def tmdb_details(media_type, tmdb_id):
+    return await cached_tmdb(
+        f"details:{media_type}:{tmdb_id}",
+        lambda: tmdb_request(f"/{media_type}/{tmdb_id}")
+    )
+
+async def laravel_post(url, payload, headers=None, timeout=10):
+    with metrics.timer("laravel_request_seconds", endpoint=url.rsplit("/", 1)[-1] or "api"):
+        async with get_http_session().post(
+            url, json=payload, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            return response.status
+
+# Scale-out coordination. Every worker receives every update, so each one
+# is claimed in Mongo and only the claiming worker handles it. Singleton jobs
+# (health probes, broadcasts, admin digests) run only on the worker holding
+# their lease, and move to another worker when it stops renewing.
+LEASE_TTL = int(os.getenv("LEASE_TTL", 30))
+
+def update_claim_key(update):
+    if isinstance(update, Message):
+        return f"m:{update.chat.id}:{update.id}"
+    return f"{type(update).__name__}:{update.id}"
+
+async def claim_update(client, update):
+    try:
+        await run_db(update_claims.insert_one, {"_id": update_claim_key(update), "worker": WORKER_NAME,
+                                                "created_at": datetime.now(timezone.utc)})
+    except DuplicateKeyError:
+        update.stop_propagation()
+    except Exception as e:
+        # Handling an update twice beats dropping it
+        logging.warning(f"Could not claim update, handling it anyway: {e}")
+
+if SCALE_OUT:
+    for handler_class in (MessageHandler, CallbackQueryHandler, InlineQueryHandler):
+        app.add_handler(handler_class(claim_update), group=-1)
 
+class Lease:
+    """Named Mongo lease held by one worker until it stops renewing it."""
+
+    def __init__(self, name, ttl=LEASE_TTL):
+        self.name = name
+        self.ttl = ttl
+
+    def acquire(self):
+        """Take or renew the lease; False while another worker holds it."""
+        now = datetime.now(timezone.utc)
+        try:
+            leases.update_one(
+                {"_id": self.name, "$or": [{"holder": WORKER_NAME}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"holder": WORKER_NAME, "expires_at": now + timedelta(seconds=self.ttl)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The filter missed because someone else holds it, and the upsert collided
+            return False
+        return True
+
+    def release(self):
+        leases.delete_one({"_id": self.name, "holder": WORKER_NAME})
+
+async def run_as_leader(name, job):
+    """Run job() on exactly one worker at a time; without scale-out just run it."""
+    if not SCALE_OUT:
+        return await job()
+    lease = Lease(name)
+    while True:
+        try:
+            acquired = await run_db(lease.acquire)
+        except Exception as e:
+            logging.warning(f"Could not acquire lease {name}: {e}")
+            acquired = False
+        if not acquired:
+            await asyncio.sleep(lease.ttl / 3)
+            continue
+
+        logging.info(f"👑 Worker {WORKER_NAME} now runs {name}")
+        task = asyncio.create_task(job())
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=lease.ttl / 3)
+                if done:
+                    await run_db(lease.release)
+                    return task.result()
+                try:
+                    renewed = await run_db(lease.acquire)
+                except Exception as e:
+                    logging.warning(f"Could not renew lease {name}: {e}")
+                    renewed = False
+                if not renewed:
+                    # Stop before the lease expires and another worker starts the job
+                    logging.warning(f"Worker {WORKER_NAME} lost the lease for {name}")
+                    break
+        finally:
+            task.cancel()
+
+# Health monitor: probes the Laravel site and MongoDB in the background so
+# handlers can read site_connected and the cached status instantly
 site_connected = False
 timeout_duration = 20
-max_retries = 3
 retry_delay = 5
+HEALTH_CHECK_INTERVAL = int(os.getenv("HEALTH_CHECK_INTERVAL", 60))
+HEALTH_HISTORY = 20
+HEALTH_SYNC_INTERVAL = 10  # seconds between reads of the leader's published status
+
+class HealthMonitor:
+    """Periodically probes dependencies and keeps their latest status and history."""
+
+    def __init__(self):
+        self.status = {}
+        self.history = {"site": deque(maxlen=HEALTH_HISTORY), "mongo": deque(maxlen=HEALTH_HISTORY)}
+
+    async def probe_site(self):
+        headers = {
+            "X-API-TOKEN": LARAVEL_API_TOKEN,
+            "User-Agent": "Mozilla/5.0",
+            "Accept": "application/json",
+            "Content-Type": "application/json"
+        }
+        # Any HTTP response means the site is reachable; the status code is kept as detail
+        status = await laravel_post(
+            LARAVEL_API_URL,
+            {"bot_name": socket.gethostname(), "status": "online"},
+            headers=headers,
+            timeout=timeout_duration
+        )
+        return f"HTTP {status}"
 
-def show_timer():
-    for i in range(timeout_duration):
-        if site_connected:
-            break
-        sys.stdout.write(f"\r⏳ [Admin ID: {ADMIN_ID}] Waiting for site response... {i + 1}/{timeout_duration} sec")
-        sys.stdout.flush()
-        time.sleep(1)
-    if not site_connected:
-        sys.stdout.write("\n")
-
-def check_site_connection():
-    global site_connected
-    bot_name = socket.gethostname()
-    headers = {
-        "X-API-TOKEN": LARAVEL_API_TOKEN,
-        "User-Agent": "Mozilla/5.0",
-        "Accept": "application/json",
-        "Content-Type": "application/json"
-    }
+    async def probe_mongo(self):
+        info = await asyncio.wait_for(run_db(mongo.server_info), timeout_duration)
+        return f"MongoDB {info.get('version', '?')}"
 
-    for attempt in range(1, max_retries + 1):
-        site_connected = False
-        print(f"\n🔄 [Admin ID: {ADMIN_ID}] Attempt {attempt} to connect to Laravel site...")
+    async def _probe(self, name, probe):
+        start = time.perf_counter()
+        try:
+            detail = await probe()
+            ok = True
+        except Exception as e:
+            detail = str(e) or type(e).__name__
+            ok = False
+        result = {"ok": ok, "latency": time.perf_counter() - start, "checked_at": time.time(), "detail": detail}
+        self.status[name] = result
+        self.history[name].append(ok)
+        return result
+
+    async def check(self):
+        global site_connected
+        site, mongo_status = await asyncio.gather(
+            self._probe("site", self.probe_site),
+            self._probe("mongo", self.probe_mongo)
+        )
+        if site["ok"] != site_connected:
+            level = logging.INFO if site["ok"] else logging.ERROR
+            logging.log(level, f"Laravel site {'connected' if site['ok'] else 'unreachable'}: {site['detail']}")
+        if not mongo_status["ok"]:
+            logging.error(f"MongoDB health check failed: {mongo_status['detail']}")
+        site_connected = site["ok"]
+        if SCALE_OUT:
+            await self.publish()
+
+    async def publish(self):
+        try:
+            await run_db(
+                bot_state.replace_one,
+                {"_id": "health"},
+                {"status": self.status, "history": {name: list(h) for name, h in self.history.items()}},
+                upsert=True
+            )
+        except Exception as e:
+            logging.warning(f"Could not publish health status: {e}")
 
-        timer_thread = threading.Thread(target=show_timer)
-        timer_thread.start()
+    async def follow(self):
+        """Mirror the status published by whichever worker runs the probes."""
+        global site_connected
+        while True:
+            try:
+                doc = await run_db(bot_state.find_one, {"_id": "health"})
+            except Exception as e:
+                logging.warning(f"Could not read shared health status: {e}")
+                doc = None
+            if doc:
+                self.status = doc["status"]
+                for name, history in doc["history"].items():
+                    self.history[name] = deque(history, maxlen=HEALTH_HISTORY)
+                site_connected = self.status.get("site", {}).get("ok", False)
+            await asyncio.sleep(HEALTH_SYNC_INTERVAL)
+
+    async def run(self):
+        failures = 0
+        while True:
+            await self.check()
+            failures = 0 if site_connected else failures + 1
+            # Retry sooner while the site is down so search recovers quickly
+            await asyncio.sleep(min(HEALTH_CHECK_INTERVAL, retry_delay * failures) if failures else HEALTH_CHECK_INTERVAL)
+
+    def describe(self, name):
+        result = self.status.get(name)
+        if not result:
+            return "⏳ Not checked yet"
+        state = "✅ Connected" if result["ok"] else "❌ Not Connected"
+        ago = int(time.time() - result["checked_at"])
+        history = "".join("🟢" if ok else "🔴" for ok in self.history[name])
+        return f"{state} ({result['latency'] * 1000:.0f} ms, {ago}s ago, {result['detail']})\n{history}"
+
+health = HealthMonitor()
+
+# Write-behind user registry: handlers only mark users as seen, and the
+# coalesced updates are upserted in bulk every USER_FLUSH_INTERVAL seconds
+USER_FLUSH_INTERVAL = int(os.getenv("USER_FLUSH_INTERVAL", 10))
+USER_SEEN_TTL = int(os.getenv("USER_SEEN_TTL", 300))
+
+class UserRegistry:
+    """Coalesces per-user profile/last_seen updates and flushes them with bulk_write."""
+
+    def __init__(self, seen_ttl=USER_SEEN_TTL, seen_size=100000):
+        self.dirty = {}
+        # Users seen within seen_ttl with unchanged names skip the write entirely
+        self.recently_seen = TTLCache(seen_size, seen_ttl)
+
+    def touch(self, user):
+        fields = {"username": user.username or user.first_name, "first_name": user.first_name}
+        if self.recently_seen.get(user.id) == fields:
+            return
+        self.recently_seen.set(user.id, fields)
+        self.dirty[user.id] = dict(fields, last_seen=time.time())
 
+    async def flush(self):
+        if not self.dirty:
+            return
+        batch, self.dirty = self.dirty, {}
         try:
-            response = requests.post(
-                LARAVEL_API_URL,
-                json={"bot_name": bot_name, "status": "online"},
-                headers=headers,
-                timeout=timeout_duration
+            await run_db(
+                users.bulk_write,
+                [UpdateOne({"user_id": user_id}, {"$set": fields}, upsert=True) for user_id, fields in batch.items()],
+                ordered=False
             )
-            site_connected = True
-            timer_thread.join()
+        except asyncio.CancelledError:
+            # Upserts are idempotent, so a write cut short by shutdown is simply redone
+            for user_id, fields in batch.items():
+                self.dirty.setdefault(user_id, fields)
+            raise
+        except Exception as e:
+            logging.error(f"Error storing {len(batch)} users in MongoDB: {e}")
+            for user_id, fields in batch.items():
+                self.dirty.setdefault(user_id, fields)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(USER_FLUSH_INTERVAL)
+            await self.flush()
+
+user_registry = UserRegistry()
+
+# Search analytics: handlers enqueue events in O(1); a background worker
+# batches them into the searches collection and the Laravel log endpoint,
+# and the admin gets a periodic digest instead of one DM per search
+ANALYTICS_QUEUE_SIZE = int(os.getenv("ANALYTICS_QUEUE_SIZE", 10000))
+ANALYTICS_BATCH_SIZE = int(os.getenv("ANALYTICS_BATCH_SIZE", 100))
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv("ANALYTICS_FLUSH_INTERVAL", 5))
+ANALYTICS_DIGEST_INTERVAL = int(os.getenv("ANALYTICS_DIGEST_INTERVAL", 3600))
+ANALYTICS_RETRIES = 3
+
+class AnalyticsPipeline:
+    """Bounded queue of search events drained in batches by a background worker."""
+
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=ANALYTICS_QUEUE_SIZE)
+        self.stats = {"queued": 0, "dropped": 0, "stored": 0, "posted": 0, "failed": 0}
+        self.digest_queries = Counter()
+        self.digest_users = set()
+        self.pending = []  # Batch the worker has taken off the queue and not yet flushed
+
+    def track_search(self, user_id, username, query):
+        # A stable _id makes re-inserting a partly stored batch harmless
+        event = {"_id": ObjectId(), "user_id": user_id, "username": username, "query": query,
+                 "created_at": time.time()}
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return
+        self.stats["queued"] += 1
+        if not SCALE_OUT:
+            # With several workers the digest is built from the searches collection instead
+            self.digest_queries[normalize_query(query)] += 1
+            self.digest_users.add(user_id)
+
+    async def _with_retries(self, name, func):
+        for attempt in range(1, ANALYTICS_RETRIES + 1):
+            try:
+                await func()
+                return True
+            except Exception as e:
+                logging.warning(f"Analytics {name} failed (attempt {attempt}/{ANALYTICS_RETRIES}): {e}")
+                if attempt < ANALYTICS_RETRIES:
+                    await asyncio.sleep(2 ** (attempt - 1))
+        return False
+
+    async def _post_batch(self, batch):
+        """Post events to the Laravel site and return the ones worth another attempt."""
+        headers = {
+            "User-Agent": "Mozilla/5.0",
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+        events = [{"user_id": e["user_id"], "username": e["username"], "query": e["query"]} for e in batch]
+        if LOG_SEARCH_BULK_URL:
+            status = await laravel_post(LOG_SEARCH_BULK_URL, {"searches": events}, headers=headers)
+            return batch if status >= 500 else []
+        statuses = await asyncio.gather(
+            *(laravel_post(LOG_SEARCH_URL, e, headers=headers) for e in events), return_exceptions=True
+        )
+        return [
+            event for event, status in zip(batch, statuses)
+            if isinstance(status, Exception) or status >= 500
+        ]
 
-            if response.status_code == 200:
-                print(f"\n✅ [Admin ID: {ADMIN_ID}] Successfully connected to Laravel site.")
-                return
-            else:
+    async def flush(self, batch):
+        unstored, unposted = batch, batch
+
+        async def store():
+            nonlocal unstored
+            try:
+                await run_db(searches.insert_many, unstored, ordered=False)
+            except BulkWriteError as e:
+                # Events an earlier attempt already stored come back as duplicate keys
+                failed = {error["index"] for error in e.details["writeErrors"] if error["code"] != 11000}
+                unstored = [event for i, event in enumerate(unstored) if i in failed]
+                if unstored:
+                    raise
+            unstored = []
+
+        async def post():
+            nonlocal unposted
+            unposted = await self._post_batch(unposted)
+            if unposted:
+                raise RuntimeError(f"Laravel site rejected {len(unposted)} of {len(batch)} events")
+
+        await asyncio.gather(self._with_retries("insert", store), self._with_retries("post", post))
+        self.stats["stored"] += len(batch) - len(unstored)
+        self.stats["posted"] += len(batch) - len(unposted)
+        self.stats["failed"] += len(unstored) + len(unposted)
+
+    async def run(self):
+        while True:
+            self.pending = [await self.queue.get()]
+            deadline = time.monotonic() + ANALYTICS_FLUSH_INTERVAL
+            while len(self.pending) < ANALYTICS_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    self.pending.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.flush(self.pending)
+            self.pending = []
+
+    async def drain(self):
+        """Flush everything still queued, including the batch of a cancelled run()."""
+        batch, self.pending = self.pending, []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        for i in range(0, len(batch), ANALYTICS_BATCH_SIZE):
+            await self.flush(batch[i:i + ANALYTICS_BATCH_SIZE])
+
+    def fleet_digest(self, since):
+        """Query counts and users from searches every worker stored since a timestamp."""
+        queries = Counter()
+        users_seen = set()
+        for doc in searches.find({"created_at": {"$gte": since}}, {"query": 1, "user_id": 1, "_id": 0}):
+            queries[normalize_query(doc["query"])] += 1
+            users_seen.add(doc["user_id"])
+        return queries, users_seen
+
+    async def send_digests(self, client):
+        while True:
+            await asyncio.sleep(ANALYTICS_DIGEST_INTERVAL)
+            if SCALE_OUT:
                 try:
-                    error_detail = response.json()
-                except ValueError:
-                    error_detail = response.text
-                print(f"\n❌ [Admin ID: {ADMIN_ID}] Status: {response.status_code}, Response: {error_detail}")
-
-        except requests.exceptions.RequestException as e:
-            site_connected = False
-            timer_thread.join()
-            print(f"\n❌ [Admin ID: {ADMIN_ID}] Error: {str(e)}")
-
-        if attempt < max_retries:
-            wait_time = retry_delay * attempt
-            print(f"🔁 [Admin ID: {ADMIN_ID}] Retrying in {wait_time} seconds...\n")
-            time.sleep(wait_time)
+                    self.digest_queries, self.digest_users = await run_db(
+                        self.fleet_digest, time.time() - ANALYTICS_DIGEST_INTERVAL
+                    )
+                except Exception as e:
+                    logging.warning(f"Failed to build search digest: {e}")
+                    continue
+            if not self.digest_queries:
+                continue
+            total = sum(self.digest_queries.values())
+            top = "\n".join(f"• `{q}` × {n}" for q, n in self.digest_queries.most_common(10))
+            text = (
+                f"🧐 {total} searches by {len(self.digest_users)} users in the last "
+                f"{ANALYTICS_DIGEST_INTERVAL // 60} min\n\n{top}\n\n"
+                f"📉 Dropped: {self.stats['dropped']}, failed batches: {self.stats['failed']}"
+            )
+            self.digest_queries.clear()
+            self.digest_users.clear()
+            try:
+                await client.send_message(ADMIN_ID, text)
+            except Exception as e:
+                logging.warning(f"Failed to send search digest to admin: {e}")
+
+analytics = AnalyticsPipeline()
+metrics.collect("search_events_total", lambda: analytics.stats)
+
+# Search sessions: what a user can page through after a search. Sessions
+# live in a bounded in-memory LRU by default, or in Mongo (SESSION_BACKEND=mongo)
+# so pagination survives restarts and works across worker processes
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "mongo" if SCALE_OUT else "memory")
+SESSION_CAPACITY = int(os.getenv("SESSION_CAPACITY", 50000))
+SESSION_TTL = int(os.getenv("SESSION_TTL", 3600))
+
+class SearchSession:
+    """Compact search results: ids in an array, movie/TV as a bitmask."""
+
+    __slots__ = ("ids", "tv_mask", "titles", "years", "posters", "genre_ids")
+
+    def __init__(self, records=()):
+        self.ids = array("q", (r["id"] for r in records))
+        self.tv_mask = 0
+        for i, record in enumerate(records):
+            if record["type"] == "tv":
+                self.tv_mask |= 1 << i
+        self.titles = [r["title"] for r in records]
+        self.years = array("H", (int(r["year"]) if r["year"].isdigit() else 0 for r in records))
+        self.posters = [r["poster"] for r in records]
+        self.genre_ids = [tuple(r["genre_ids"]) for r in records]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def extend(self, records):
+        more = SearchSession(records)
+        self.tv_mask |= more.tv_mask << len(self.ids)
+        self.ids.extend(more.ids)
+        self.titles += more.titles
+        self.years.extend(more.years)
+        self.posters += more.posters
+        self.genre_ids += more.genre_ids
+
+    def record(self, i):
+        return {
+            "id": self.ids[i],
+            "type": "tv" if self.tv_mask >> i & 1 else "movie",
+            "title": self.titles[i],
+            "year": str(self.years[i]) if self.years[i] else "N/A",
+            "poster": self.posters[i],
+            "genre_ids": list(self.genre_ids[i])
+        }
+
+    def records(self, start, stop):
+        return [self.record(i) for i in range(max(start, 0), min(stop, len(self)))]
+
+    def to_doc(self):
+        return {
+            "ids": self.ids.tolist(),
+            "tv_mask": str(self.tv_mask),  # may exceed Mongo's 64-bit integers
+            "titles": self.titles,
+            "years": self.years.tolist(),
+            "posters": self.posters,
+            "genre_ids": [list(g) for g in self.genre_ids]
+        }
+
+    @classmethod
+    def from_doc(cls, doc):
+        session = cls()
+        session.ids = array("q", doc["ids"])
+        session.tv_mask = int(doc["tv_mask"])
+        session.titles = doc["titles"]
+        session.years = array("H", doc["years"])
+        session.posters = doc["posters"]
+        session.genre_ids = [tuple(g) for g in doc["genre_ids"]]
+        return session
+
+class MemorySessionStore:
+    """Capacity-bounded LRU of sessions with a sliding TTL.
+
+    Reads refresh both recency and expiry, so the least recently used entry
+    is also the next to expire and expiry only ever looks at the LRU head.
+    """
+
+    def __init__(self, capacity=SESSION_CAPACITY, ttl=SESSION_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+
+    def _expire(self):
+        now = time.time()
+        while self._sessions:
+            key, (expires_at, _) = next(iter(self._sessions.items()))
+            if expires_at > now:
+                break
+            del self._sessions[key]
+
+    async def get(self, key):
+        self._expire()
+        entry = self._sessions.get(key)
+        if entry is None:
+            return None
+        self._sessions[key] = (time.time() + self.ttl, entry[1])
+        self._sessions.move_to_end(key)
+        return entry[1]
+
+    async def put(self, key, session):
+        self._expire()
+        self._sessions[key] = (time.time() + self.ttl, session)
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.capacity:
+            self._sessions.popitem(last=False)
+
+    async def extend(self, key, records):
+        """Append records to a live session; returns False if it has expired."""
+        session = await self.get(key)
+        if session is None:
+            return False
+        session.extend(records)
+        return True
+
+    def __len__(self):
+        return len(self._sessions)
+
+class MongoSessionStore:
+    """Sessions shared through the search_sessions collection, expired by a TTL index.
+
+    While Mongo is unavailable new sessions are kept in this process instead,
+    so searches keep working; their buttons then only work on this worker.
+    """
+
+    def __init__(self, collection, ttl=SESSION_TTL):
+        self.collection = collection
+        self.ttl = ttl
+        self.fallback = MemorySessionStore(ttl=ttl)
+
+    async def get(self, key):
+        session = await self.fallback.get(key)
+        if session is not None or not mongo_available():
+            return session
+        try:
+            doc = await run_db(
+                self.collection.find_one_and_update,
+                {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                {"$set": {"expires_at": datetime.now(timezone.utc) + timedelta(seconds=self.ttl)}}
+            )
+        except Exception as e:
+            logging.warning(f"Session lookup failed for {key}: {e}")
+            return None
+        return SearchSession.from_doc(doc) if doc else None
+
+    async def put(self, key, session):
+        if mongo_available():
+            doc = session.to_doc()
+            doc["expires_at"] = datetime.now(timezone.utc) + timedelta(seconds=self.ttl)
+            try:
+                await run_db(self.collection.replace_one, {"_id": key}, doc, upsert=True)
+                return
+            except Exception as e:
+                logging.warning(f"Failed to store session {key} in Mongo, keeping it in memory: {e}")
+        await self.fallback.put(key, session)
+
+    async def extend(self, key, records):
+        """Append records to a live session; returns False if it has expired."""
+        if await self.fallback.extend(key, records):
+            return True
+        session = await self.get(key)
+        if session is None:
+            return False
+        session.extend(records)
+        await self.put(key, session)
+        return True
+
+sessions = MongoSessionStore(search_sessions) if SESSION_BACKEND == "mongo" else MemorySessionStore()
+
+# Local title index: trigram inverted index over titles accumulated from
+# TMDb search responses and, optionally, the TMDb daily ID exports. Confident
+# matches answer year-qualified and misspelled queries in-process; for other
+# queries they only rank TMDb's results, since the index can't tell which
+# sequels, spin-offs or namesakes of an exact title it is missing.
+TITLE_INDEX_MIN_SCORE = float(os.getenv("TITLE_INDEX_MIN_SCORE", 0.8))
+TITLE_INDEX_SCAN_DEPTH = 200  # most popular entries read from each posting per query
+TITLE_INDEX_EXPORTS = os.getenv("TITLE_INDEX_EXPORTS") == "1"
+TMDB_EXPORT_URL = "https://files.tmdb.org/p/exports/{kind}_ids_{date}.json.gz"
+
+NON_WORD = re.compile(r"[\W_]+")
+
+def title_key(title):
+    if not title.isascii():
+        title = unicodedata.normalize("NFKD", title)
+        title = "".join(c for c in title if not unicodedata.combining(c))
+    return " ".join(NON_WORD.sub(" ", title.lower()).split())
+
+def trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def title_similarity(grams, title):
+    """Jaccard similarity of query trigrams and a title's; 1.0 means they match."""
+    title_grams = trigrams(title_key(title))
+    return len(grams & title_grams) / len(grams | title_grams) if grams else 0.0
+
+class TitleIndex:
+    """Array-backed trigram index of (type, id, title, year, popularity) entries.
+
+    Titles are packed into one UTF-8 buffer with offsets, and posters/genres
+    are only kept for the (few) entries that came from search responses.
+    Postings are ordered by popularity, so a query only reads the head of
+    each one.
+    """
+
+    def __init__(self):
+        self.ids = array("q")
+        self.tv = bytearray()
+        self.years = array("H")
+        self.popularity = array("f")
+        self.offsets = array("I", [0])
+        self.text = bytearray()
+        self.posters = {}
+        self.genre_ids = {}
+        self.postings = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def title(self, i):
+        return self.text[self.offsets[i]:self.offsets[i + 1]].decode()
+
+    def _find(self, tmdb_id, is_tv, grams):
+        postings = [self.postings[g] for g in grams if g in self.postings]
+        if not postings:
+            return None
+        for i in min(postings, key=len):
+            if self.ids[i] == tmdb_id and self.tv[i] == is_tv:
+                return i
+        return None
+
+    def _by_popularity(self, i):
+        return -self.popularity[i]
+
+    def add(self, media_type, tmdb_id, title, year=0, popularity=0.0, poster=None, genre_ids=None, bulk=False):
+        """Add or update an entry.
+
+        bulk=True skips the duplicate check and posting order for fast
+        loading of unique entries; call sort_postings() afterwards.
+        """
+        key = title_key(title or "")
+        if not key:
+            return
+        grams = trigrams(key)
+        is_tv = media_type == "tv"
+        i = None if bulk else self._find(tmdb_id, is_tv, grams)
+        if i is None:
+            i = len(self.ids)
+            self.ids.append(tmdb_id)
+            self.tv.append(is_tv)
+            self.years.append(year)
+            self.popularity.append(popularity)
+            self.text += title.encode()
+            self.offsets.append(len(self.text))
+            for gram in grams:
+                posting = self.postings.get(gram)
+                if posting is None:
+                    self.postings[gram] = array("I", [i])
+                elif bulk:
+                    posting.append(i)
+                else:
+                    bisect.insort(posting, i, key=self._by_popularity)
         else:
-            print(f"🚨 [Admin ID: {ADMIN_ID}] All retry attempts failed. Bypassing this connection attempt.")
+            self.years[i] = year or self.years[i]
+            self.popularity[i] = popularity or self.popularity[i]
+        if poster:
+            self.posters[i] = poster
+        if genre_ids:
+            self.genre_ids[i] = tuple(genre_ids)
+
+    def sort_postings(self):
+        for gram, posting in self.postings.items():
+            self.postings[gram] = array("I", sorted(posting, key=self._by_popularity))
+
+    def add_results(self, media_type, results):
+        for result in results:
+            record = make_record(media_type, result)
+            self.add(
+                media_type, record["id"], record["title"],
+                year=int(record["year"]) if record["year"].isdigit() else 0,
+                popularity=result.get("popularity") or 0.0,
+                poster=record["poster"],
+                genre_ids=record["genre_ids"]
+            )
+
+    def merge_from(self, other):
+        for i in range(len(other)):
+            self.add(
+                "tv" if other.tv[i] else "movie", other.ids[i], other.title(i),
+                year=other.years[i], popularity=other.popularity[i],
+                poster=other.posters.get(i), genre_ids=other.genre_ids.get(i)
+            )
+
+    def search(self, query, year=None, limit=20):
+        """Return [(score, record)] best first.
+
+        The score is the Jaccard similarity of the query and title trigram
+        sets, so a short query contained in a longer title scores low and
+        1.0 means the two match.
+        """
+        key = title_key(query)
+        grams = trigrams(key) if key else set()
+        postings = [self.postings[g] for g in grams if g in self.postings]
+        if not postings:
+            return []
+
+        # Candidates are the most popular entries of each posting, so common
+        # trigrams like " th" cost no more than rare ones; each candidate is
+        # then scored exactly against the query
+        hits = Counter()
+        for posting in postings:
+            hits.update(posting[:TITLE_INDEX_SCAN_DEPTH])
+        want_year = int(year) if year else 0
+
+        scored = []
+        for i, _ in hits.most_common():
+            if want_year and self.years[i] != want_year:
+                continue
+            if len(scored) == limit * 3:
+                break
+            scored.append((title_similarity(grams, self.title(i)), self.popularity[i], i))
+        scored.sort(reverse=True)
+        return [(score, self.record(i)) for score, _, i in scored[:limit]]
+
+    def record(self, i):
+        return {
+            "id": self.ids[i],
+            "type": "tv" if self.tv[i] else "movie",
+            "title": self.title(i),
+            "year": str(self.years[i]) if self.years[i] else "N/A",
+            "poster": self.posters.get(i),
+            "genre_ids": list(self.genre_ids.get(i, ()))
+        }
+
+title_index = TitleIndex()
+
+def build_export_index(payloads):
+    """Parse gzipped TMDb ID exports into a fresh TitleIndex (runs in a worker thread)."""
+    index = TitleIndex()
+    for media_type, payload in payloads:
+        title_field = "original_title" if media_type == "movie" else "original_name"
+        for line in gzip.decompress(payload).splitlines():
+            entry = json.loads(line)
+            if entry.get("adult"):
+                continue
+            index.add(media_type, entry["id"], entry.get(title_field), popularity=entry.get("popularity") or 0.0, bulk=True)
+    index.sort_postings()
+    return index
+
+async def load_title_exports():
+    global title_index
+    date = (datetime.now(timezone.utc) - timedelta(days=1)).strftime("%m_%d_%Y")
+    payloads = []
+    for media_type, kind in (("movie", "movie"), ("tv", "tv_series")):
+        url = TMDB_EXPORT_URL.format(kind=kind, date=date)
+        try:
+            async with get_http_session().get(url, timeout=aiohttp.ClientTimeout(total=300)) as response:
+                response.raise_for_status()
+                payloads.append((media_type, await response.read()))
+        except Exception as e:
+            logging.error(f"Failed to download TMDb export {url}: {e}")
+    if not payloads:
+        return
+
+    loop = asyncio.get_running_loop()
+    index = await loop.run_in_executor(None, build_export_index, payloads)
+    # Entries learned from searches while the export was loading carry years and posters
+    index.merge_from(title_index)
+    title_index = index
+    logging.info(f"Loaded {len(title_index)} titles into the local title index")
+
+def parse_query(text):
+    """Split user text into (lowercased title query, four-digit year or None)."""
+    year_match = re.search(r'\b(\d{4})\b', text)
+    search_year = year_match.group(1) if year_match else None
+    search_query = re.sub(r'\b\d{4}\b', '', text).strip().lower()
+    return search_query, search_year
+
+SEARCH_MAX_PAGES = int(os.getenv("SEARCH_MAX_PAGES", 3))
+
+async def search_titles(search_query, search_year=None):
+    """Records for a query, and the (type, page) TMDb pages still left to fetch.
+
+    Year-qualified or misspelled queries with confident local title index
+    matches are answered from the index unless TMDb's first pages are cached;
+    otherwise the first movie and TV pages are searched concurrently and
+    titles the query names are moved to the front.
+    """
+    local = [(score, record) for score, record in title_index.search(search_query, year=search_year)
+             if score >= TITLE_INDEX_MIN_SCORE]
+    cached = all(tmdb_cache.get(search_cache_key(media_type, search_query)) for media_type in ("movie", "tv"))
+    if local and not cached and (search_year or local[0][0] < 1.0):
+        metrics.inc("search_answers_total", source="title_index")
+        return [record for score, record in local], []
+
+    movie_page, tv_page = await asyncio.gather(tmdb_search("movie", search_query), tmdb_search("tv", search_query))
+    records = [make_record("movie", r) for r in movie_page["results"]] + [make_record("tv", r) for r in tv_page["results"]]
+    grams = trigrams(title_key(search_query))
+    # Stable sort, so TMDb's order holds among the named titles and the rest
+    records.sort(key=lambda record: title_similarity(grams, record["title"]) < TITLE_INDEX_MIN_SCORE)
+    metrics.inc("search_answers_total", source="tmdb")
+    remaining = [
+        (media_type, page)
+        for page in range(2, SEARCH_MAX_PAGES + 1)
+        for media_type, first_page in (("movie", movie_page), ("tv", tv_page))
+        if page <= first_page["total_pages"]
+    ]
+    return records, remaining
+
+async def stream_remaining_pages(token, search_query, remaining, search_year=None):
+    """Fetch the remaining result pages in the background and append them to the session."""
+    for page in sorted({page for _, page in remaining}):
+        batch = [media_type for media_type, p in remaining if p == page]
+        responses = await asyncio.gather(
+            *(tmdb_search(media_type, search_query, page) for media_type in batch), return_exceptions=True
+        )
+        records = []
+        for media_type, response in zip(batch, responses):
+            if isinstance(response, Exception):
+                logging.warning(f"Failed to fetch {media_type} page {page} for '{search_query}': {response}")
+                continue
+            records += [make_record(media_type, r) for r in response["results"]]
+        if search_year:
+            records = [r for r in records if r["year"] == search_year]
+        if records and not await sessions.extend(token, records):
             return
 
+# Poster delivery: once Telegram has fetched an image URL (a poster or the
+# welcome picture) the file_id of that copy is remembered, in memory and in
+# the poster_files collection, and reused so later sends skip the download.
+# A file_id Telegram no longer accepts is dropped and the URL is sent instead.
+POSTER_FILE_CACHE_SIZE = int(os.getenv("POSTER_FILE_CACHE_SIZE", 20000))
+POSTER_FILE_TTL = int(os.getenv("POSTER_FILE_TTL", 30 * 86400))
+POSTER_MISS_TTL = 600  # How long an unknown URL is remembered as unknown before asking Mongo again
+STALE_FILE_ERRORS = (FileIdInvalid, FileReferenceExpired, FileReferenceInvalid, MediaEmpty)
+
+poster_file_cache = TTLCache(POSTER_FILE_CACHE_SIZE, POSTER_FILE_TTL)
+poster_stats = {"reused": 0, "uploaded": 0, "stale": 0}
+metrics.collect("poster_sends_total", lambda: poster_stats)
+
+async def poster_file_id(url):
+    file_id = poster_file_cache.get(url)
+    if file_id is None:
+        if not mongo_available():
+            return None
+        try:
+            doc = await run_db(poster_files.find_one, {"_id": url})
+        except Exception as e:
+            logging.warning(f"Poster file_id lookup failed for {url}: {e}")
+            return None
+        file_id = doc["file_id"] if doc else ""
+        poster_file_cache.set(url, file_id, ttl=None if file_id else POSTER_MISS_TTL)
+    return file_id or None
+
+def _store_poster_file(url, file_id):
+    try:
+        poster_files.update_one(
+            {"_id": url},
+            {"$set": {"file_id": file_id, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+    except Exception as e:
+        logging.warning(f"Failed to persist poster file_id for {url}: {e}")
+
+def remember_poster(url, message):
+    photo = getattr(message, "photo", None)
+    if photo is None:
+        return
+    poster_stats["uploaded"] += 1
+    poster_file_cache.set(url, photo.file_id)
+    if mongo_available():
+        db_executor.submit(_store_poster_file, url, photo.file_id)
+
+def forget_poster(url, error):
+    # The URL send that follows overwrites the stored entry with a fresh file_id
+    logging.info(f"Cached file_id for {url} was rejected ({error}), sending the URL instead")
+    poster_stats["stale"] += 1
+    poster_file_cache.pop(url)
+
+async def send_poster(client, chat_id, url, **kwargs):
+    """send_photo for an image URL, reusing Telegram's copy when one is known."""
+    file_id = await poster_file_id(url)
+    if file_id:
+        try:
+            message = await client.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+            poster_stats["reused"] += 1
+            return message
+        except STALE_FILE_ERRORS as e:
+            forget_poster(url, e)
+    message = await client.send_photo(chat_id=chat_id, photo=url, **kwargs)
+    remember_poster(url, message)
+    return message
+
+async def edit_poster(client, message, url, caption, reply_markup):
+    """Swap the photo and caption of message to the image at url."""
+    file_id = await poster_file_id(url)
+    if file_id:
+        try:
+            edited = await client.edit_message_media(
+                message.chat.id, message.id, InputMediaPhoto(file_id, caption=caption), reply_markup=reply_markup
+            )
+            poster_stats["reused"] += 1
+            return edited
+        except STALE_FILE_ERRORS as e:
+            forget_poster(url, e)
+    edited = await client.edit_message_media(
+        message.chat.id, message.id, InputMediaPhoto(url, caption=caption), reply_markup=reply_markup
+    )
+    remember_poster(url, edited)
+    return edited
+
 # Start command handler with user storage
 @app.on_message(filters.command("start"))
+@instrumented("start")
 async def start(client, message: Message):
     user = message.from_user
-    user_id = user.id
     user_name = user.first_name
-    username = user.username or user_name
 
-    # Store user in MongoDB
-    try:
-        users.update_one(
-            {"user_id": user_id},
-            {
-                "$set": {
-                    "username": username,
-                    "first_name": user_name,
-                    "last_seen": time.time()
-                }
-            },
-            upsert=True
-        )
-    except Exception as e:
-        logging.error(f"Error storing user {user_id} in MongoDB: {e}")
+    # Store user in MongoDB (buffered, see UserRegistry)
+    user_registry.touch(user)
 
     welcome_message = (
         f"👋 Hᴇʟʟᴏ, {user_name}!\n\n"
@@ -166,20 +1522,392 @@ async def start(client, message: Message):
         [InlineKeyboardButton("Bᴏᴛ Dᴇᴠᴇʟᴏᴘᴇʀ", url="https://t.me/Attitude2688")]
     ]
     
-    await client.send_photo(
-        chat_id=message.chat.id,
-        photo=image_url,
+    await send_poster(
+        client,
+        message.chat.id,
+        image_url,
         caption=welcome_message,
         reply_markup=InlineKeyboardMarkup(buttons)
     )
 
+# Broadcast engine: a bounded pool of senders paced by a token bucket that
+# backs off on FloodWait, with progress checkpointed in Mongo
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", 20))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", 25))  # messages per second
+BROADCAST_CHUNK = 200  # users per checkpoint
+BROADCAST_STATUS_INTERVAL = 10  # seconds between status message edits
+BROADCAST_DB_RETRIES = 5  # attempts at each user load or checkpoint, 30s of backoff in all
+DEAD_USER_ERRORS = (UserIsBlocked, ChatInvalid, UserDeactivated, InputUserDeactivated)
+DEAD_USER_BATCH = 500
+
+class DeadUserSink:
+    """Buffers users that blocked the bot or were deleted and removes them in bulk."""
+
+    def __init__(self, batch_size=DEAD_USER_BATCH):
+        self.batch_size = batch_size
+        self.pending = set()
+        self.removed = 0
+        self._flushing = None
+
+    def add(self, user_id):
+        self.pending.add(user_id)
+        if len(self.pending) >= self.batch_size and not self._flushing:
+            self._flushing = asyncio.create_task(self.flush())
+
+    async def flush(self):
+        try:
+            while self.pending:
+                batch = list(self.pending)[:self.batch_size]
+                self.pending.difference_update(batch)
+                try:
+                    result = await run_db(users.bulk_write, [DeleteOne({"user_id": u}) for u in batch], ordered=False)
+                except Exception as e:
+                    logging.error(f"Error removing {len(batch)} dead users from MongoDB: {e}")
+                    self.pending.update(batch)
+                    return
+                self.removed += result.deleted_count
+                logging.info(f"Removed {result.deleted_count} blocked/invalid users from database")
+        finally:
+            self._flushing = None
+
+dead_users = DeadUserSink()
+
+class TokenBucket:
+    """Async token bucket that halves its rate on FloodWait and slowly recovers."""
+
+    def __init__(self, rate, min_rate=1):
+        self.max_rate = rate
+        self.min_rate = min_rate
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def flood_wait(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = 0
+
+    def success(self):
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+
+def serialize_markup(markup):
+    if not markup:
+        return None
+    rows = []
+    for row in markup.inline_keyboard:
+        buttons = []
+        for button in row:
+            data = {"text": button.text}
+            if button.url:
+                data["url"] = button.url
+            if button.callback_data:
+                data["callback_data"] = button.callback_data
+            buttons.append(data)
+        rows.append(buttons)
+    return rows
+
+def deserialize_markup(rows):
+    if not rows:
+        return None
+    return InlineKeyboardMarkup([[InlineKeyboardButton(**button) for button in row] for row in rows])
+
+async def deliver_broadcast(client, chat_id, content, reply_markup):
+    if content["type"] == "photo":
+        await client.send_photo(chat_id=chat_id, photo=content["file_id"], caption=content["text"] or "", reply_markup=reply_markup)
+    elif content["type"] == "video":
+        await client.send_video(chat_id=chat_id, video=content["file_id"], caption=content["text"] or "", reply_markup=reply_markup)
+    elif content["type"] == "document":
+        await client.send_document(chat_id=chat_id, document=content["file_id"], caption=content["text"] or "", reply_markup=reply_markup)
+    else:
+        await client.send_message(chat_id=chat_id, text=content["text"], reply_markup=reply_markup)
+
+class BroadcastJob:
+    """Runtime side of a broadcast_jobs document."""
+
+    def __init__(self, client, doc):
+        self.client = client
+        self.id = doc["_id"]
+        self.content = doc["content"]
+        self.reply_markup = deserialize_markup(self.content.get("buttons"))
+        self.status_chat_id = doc["status_chat_id"]
+        self.status_message_id = doc["status_message_id"]
+        self.total = doc["total"]
+        self.success = doc.get("success", 0)
+        self.failed = doc.get("failed", 0)
+        self.last_user_id = doc.get("last_user_id")
+        self.status = doc["status"]
+        self.resumed = asyncio.Event()
+        if self.status == "running":
+            self.resumed.set()
+        self.limiter = TokenBucket(BROADCAST_RATE)
+        self.flood_waits = 0
+        self.task = None
+
+    def summary(self):
+        return (
+            f"📢 Broadcast {self.status}\n"
+            f"🔄 Sent to: {self.success + self.failed}/{self.total} users\n"
+            f"✅ Success: {self.success}\n"
+            f"❌ Failed: {self.failed}\n"
+            f"⏳ FloodWaits: {self.flood_waits}, rate: {self.limiter.rate:.1f}/s"
+        )
+
+    async def set_status(self, status):
+        self.status = status
+        if status == "running":
+            self.resumed.set()
+        else:
+            self.resumed.clear()
+        if status == "cancelled":
+            # Wake up a paused runner so it can exit
+            self.resumed.set()
+        await self.checkpoint()
+
+    async def checkpoint(self):
+        await dead_users.flush()
+        await run_db(
+            broadcast_jobs.update_one,
+            {"_id": self.id},
+            {"$set": {
+                "status": self.status,
+                "success": self.success,
+                "failed": self.failed,
+                "last_user_id": self.last_user_id,
+                "updated_at": time.time()
+            }}
+        )
+
+    async def with_retries(self, what, func):
+        for attempt in range(1, BROADCAST_DB_RETRIES + 1):
+            try:
+                return await func()
+            except Exception as e:
+                logging.warning(f"Broadcast {self.id} {what} failed (attempt {attempt}/{BROADCAST_DB_RETRIES}): {e}")
+                if attempt == BROADCAST_DB_RETRIES:
+                    raise
+                await asyncio.sleep(2 ** attempt)
+
+    async def send_to(self, user_id, slots):
+        async with slots:
+            for _ in range(5):
+                await self.resumed.wait()
+                if self.status == "cancelled":
+                    return
+                await self.limiter.acquire()
+                try:
+                    with raising_flood_waits():
+                        await deliver_broadcast(self.client, user_id, self.content, self.reply_markup)
+                    self.success += 1
+                    self.limiter.success()
+                    return
+                except FloodWait as e:
+                    self.flood_waits += 1
+                    self.limiter.flood_wait(e.value)
+                    logging.warning(f"FloodWait of {e.value}s during broadcast {self.id}")
+                except DEAD_USER_ERRORS:
+                    dead_users.add(user_id)
+                    break
+                except Exception as e:
+                    logging.warning(f"Failed to send broadcast to user {user_id}: {e}")
+                    break
+            self.failed += 1
+
+    async def report_progress(self):
+        while True:
+            await asyncio.sleep(BROADCAST_STATUS_INTERVAL)
+            try:
+                await self.client.edit_message_text(self.status_chat_id, self.status_message_id, self.summary())
+            except Exception as e:
+                logging.debug(f"Could not update broadcast status message: {e}")
+
+    async def run(self):
+        slots = asyncio.Semaphore(BROADCAST_WORKERS)
+        reporter = asyncio.create_task(self.report_progress())
+        note = ""
+        saved = True
+        try:
+            try:
+                while self.status != "cancelled":
+                    await self.resumed.wait()
+                    query = {"user_id": {"$gt": self.last_user_id}} if self.last_user_id is not None else {}
+                    chunk = await self.with_retries("user load", lambda: run_db(
+                        lambda: [u["user_id"] for u in users.find(query, {"user_id": 1}).sort("user_id", 1).limit(BROADCAST_CHUNK)]
+                    ))
+                    if not chunk:
+                        break
+                    await asyncio.gather(*(self.send_to(user_id, slots) for user_id in chunk))
+                    if self.status == "cancelled":
+                        break
+                    self.last_user_id = chunk[-1]
+                    await self.with_retries("checkpoint", self.checkpoint)
+                if self.status != "cancelled":
+                    self.status = "completed"
+                await self.with_retries("checkpoint", self.checkpoint)
+            except Exception as e:
+                logging.error(f"Broadcast {self.id} stopped after user {self.last_user_id}: {e}")
+                self.status = "failed"
+                note = f"\n⚠️ Stopped by a database error: {e}"
+                try:
+                    await self.checkpoint()
+                except Exception as e:
+                    logging.error(f"Could not mark broadcast {self.id} failed: {e}")
+                    saved = False
+                    # Its document still says running, so it resumes from the last checkpoint
+                    if SCALE_OUT:
+                        note += "\nIt resumes from the last checkpoint once the database is back."
+                    else:
+                        note += "\nIt resumes from the last checkpoint after a restart."
+        finally:
+            reporter.cancel()
+            # An unsaved failure stays listed so no second broadcast starts
+            # alongside it; in scale-out mode the supervisor restarts it instead
+            if saved or SCALE_OUT:
+                active_broadcasts.pop(self.id, None)
+
+        try:
+            await self.client.edit_message_text(
+                self.status_chat_id,
+                self.status_message_id,
+                f"📢 Broadcast {self.status}!\n"
+                f"🔄 Total users: {self.total}\n"
+                f"✅ Successfully sent to: {self.success} users\n"
+                f"❌ Failed to send to: {self.failed} users{note}"
+            )
+        except Exception as e:
+            logging.warning(f"Could not send final broadcast status: {e}")
+        logging.info(
+            f"Broadcast {self.id} by Admin ID {ADMIN_ID} {self.status}: "
+            f"Type: {self.content['type']}, "
+            f"Message: '{self.content['text'] or 'Media with no caption'}', "
+            f"Buttons: {self.reply_markup is not None}, "
+            f"Total: {self.total}, Success: {self.success}, Failed: {self.failed}"
+        )
+
+active_broadcasts = {}
+
+def start_broadcast_job(client, doc):
+    job = BroadcastJob(client, doc)
+    active_broadcasts[job.id] = job
+    job.task = asyncio.create_task(job.run())
+    return job
+
+async def resume_broadcasts(client):
+    try:
+        docs = await run_db(lambda: list(broadcast_jobs.find({"status": {"$in": ["running", "paused"]}})))
+    except Exception as e:
+        logging.error(f"Error loading unfinished broadcasts: {e}")
+        return
+    for doc in docs:
+        logging.info(f"Resuming broadcast {doc['_id']} ({doc['status']}) after user {doc.get('last_user_id')}")
+        start_broadcast_job(client, doc)
+
+BROADCAST_POLL_INTERVAL = 5  # seconds between scans for new jobs and control requests in scale-out mode
+
+async def unfinished_broadcast():
+    try:
+        return await run_db(broadcast_jobs.find_one, {"status": {"$in": ["running", "paused"]}})
+    except Exception as e:
+        logging.error(f"Error loading unfinished broadcasts: {e}")
+        return None
+
+async def supervise_broadcasts(client):
+    """Run every unfinished broadcast on this worker and apply control requests made on others."""
+    try:
+        while True:
+            try:
+                docs = await run_db(lambda: list(broadcast_jobs.find({"status": {"$in": ["running", "paused"]}})))
+            except Exception as e:
+                logging.error(f"Error loading unfinished broadcasts: {e}")
+                docs = []
+            for doc in docs:
+                job = active_broadcasts.get(doc["_id"])
+                if job is None:
+                    logging.info(f"Taking over broadcast {doc['_id']} ({doc['status']}) after user {doc.get('last_user_id')}")
+                    job = start_broadcast_job(client, doc)
+                requested = doc.get("requested_status")
+                if requested:
+                    await run_db(broadcast_jobs.update_one, {"_id": job.id}, {"$unset": {"requested_status": ""}})
+                    await job.set_status(requested)
+            await asyncio.sleep(BROADCAST_POLL_INTERVAL)
+    finally:
+        # Lost the lease: the next leader resumes from the last checkpoint
+        for job in list(active_broadcasts.values()):
+            job.task.cancel()
+
+async def broadcast_control(message: Message, action):
+    job = next(iter(active_broadcasts.values()), None)
+    if not job and SCALE_OUT:
+        doc = await unfinished_broadcast()
+        if doc:
+            await remote_broadcast_control(message, doc, action)
+            return
+    if not job:
+        await message.reply("😕 No broadcast is currently running.")
+        return
+    if action == "pause" and job.status == "running":
+        await job.set_status("paused")
+    elif action == "resume" and job.status == "paused":
+        await job.set_status("running")
+    elif action == "cancel":
+        await job.set_status("cancelled")
+        if job.task.done():
+            # A job stopped by a database error, kept until its state was saved
+            active_broadcasts.pop(job.id, None)
+    await message.reply(job.summary())
+
+async def remote_broadcast_control(message: Message, doc, action):
+    """broadcast_control for a job running on another worker."""
+    if action == "status":
+        await message.reply(
+            f"📢 Broadcast {doc['status']} (on another worker)\n"
+            f"🔄 Sent to: {doc['success'] + doc['failed']}/{doc['total']} users\n"
+            f"✅ Success: {doc['success']}\n"
+            f"❌ Failed: {doc['failed']}"
+        )
+        return
+    requested = {"pause": "paused", "resume": "running", "cancel": "cancelled"}[action]
+    await run_db(broadcast_jobs.update_one, {"_id": doc["_id"]}, {"$set": {"requested_status": requested}})
+    await message.reply(f"⏳ Asked the worker running the broadcast to {action} it.")
+
 # Broadcast command handler
 @app.on_message(filters.command("broadcast") & filters.user(ADMIN_ID))
+@instrumented("broadcast")
 async def broadcast(client: Client, message: Message):
     if message.from_user.id != ADMIN_ID:
         await message.reply("🚫 You are not authorized to use this command.")
         return
 
+    # /broadcast status|pause|resume|cancel controls the running job
+    if not message.reply_to_message and message.text:
+        text_parts = message.text.split(maxsplit=1)
+        if len(text_parts) > 1 and text_parts[1].strip().lower() in ("status", "pause", "resume", "cancel"):
+            await broadcast_control(message, text_parts[1].strip().lower())
+            return
+
+    if active_broadcasts or (SCALE_OUT and await unfinished_broadcast()):
+        await message.reply("⚠️ A broadcast is already running. Use /broadcast status, pause or cancel.")
+        return
+    if prune_progress["running"]:
+        await message.reply("⚠️ /prune is still checking users. Try again once it has finished.")
+        return
+
     # Check if the message is a reply to another message
     target_message = message.reply_to_message if message.reply_to_message else message
 
@@ -219,10 +1947,8 @@ async def broadcast(client: Client, message: Message):
         await message.reply("⚠️ Please provide a valid message, photo, video, or document to broadcast, or reply to a message.")
         return
 
-    # Get all users from MongoDB
     try:
-        user_list = users.find({}, {"user_id": 1})
-        total_users = users.count_documents({})
+        total_users = await run_db(users.count_documents, {})
     except Exception as e:
         logging.error(f"Error fetching users from MongoDB: {e}")
         await message.reply("❌ Error accessing user database.")
@@ -232,99 +1958,129 @@ async def broadcast(client: Client, message: Message):
         await message.reply("😕 No users found to broadcast to.")
         return
 
-    # Initialize counters
-    success_count = 0
-    failed_count = 0
-    batch_size = 100  # Update status every 100 users
+    broadcast_type = "photo" if broadcast_photo else "video" if broadcast_video else "document" if broadcast_document else "text"
     loading_msg = await message.reply(f"📢 Broadcasting to {total_users} users...")
+    doc = {
+        "_id": f"{int(time.time())}-{message.id}",
+        "status": "running",
+        "content": {
+            "type": broadcast_type,
+            "text": broadcast_message,
+            "file_id": broadcast_photo or broadcast_video or broadcast_document,
+            "buttons": serialize_markup(broadcast_reply_markup)
+        },
+        "status_chat_id": loading_msg.chat.id,
+        "status_message_id": loading_msg.id,
+        "total": total_users,
+        "success": 0,
+        "failed": 0,
+        "last_user_id": None,
+        "created_at": time.time(),
+        "updated_at": time.time()
+    }
+    try:
+        await run_db(broadcast_jobs.insert_one, doc)
+    except Exception as e:
+        logging.error(f"Error saving broadcast job: {e}")
+        await loading_msg.edit("❌ Error accessing user database.")
+        return
 
-    # Broadcast to users
-    for i, user in enumerate(user_list):
-        user_id = user["user_id"]
-        try:
-            if broadcast_photo:
-                await client.send_photo(
-                    chat_id=user_id,
-                    photo=broadcast_photo,
-                    caption=broadcast_message or "",
-                    reply_markup=broadcast_reply_markup
-                )
-            elif broadcast_video:
-                await client.send_video(
-                    chat_id=user_id,
-                    video=broadcast_video,
-                    caption=broadcast_message or "",
-                    reply_markup=broadcast_reply_markup
-                )
-            elif broadcast_document:
-                await client.send_document(
-                    chat_id=user_id,
-                    document=broadcast_document,
-                    caption=broadcast_message or "",
-                    reply_markup=broadcast_reply_markup
-                )
-            else:
-                await client.send_message(
-                    chat_id=user_id,
-                    text=broadcast_message,
-                    reply_markup=broadcast_reply_markup
-                )
-            success_count += 1
-        except (pyrogram.errors.UserIsBlocked, pyrogram.errors.ChatInvalid, pyrogram.errors.UserDeactivated):
-            try:
-                users.delete_one({"user_id": user_id})
-                logging.info(f"Removed blocked/invalid user {user_id} from database")
-            except Exception as e:
-                logging.error(f"Error removing user {user_id} from MongoDB: {e}")
-            failed_count += 1
-        except Exception as e:
-            logging.warning(f"Failed to send broadcast to user {user_id}: {e}")
-            failed_count += 1
-
-        # Update status every batch_size users
-        if (i + 1) % batch_size == 0:
-            await loading_msg.edit(
-                f"📢 Broadcasting in progress...\n"
-                f"🔄 Sent to: {success_count + failed_count}/{total_users} users\n"
-                f"✅ Success: {success_count}\n"
-                f"❌ Failed: {failed_count}"
-            )
-        await asyncio.sleep(0.05)  # Rate limit: 50ms delay
-
-    # Final status update
-    await loading_msg.edit(
-        f"📢 Broadcast completed!\n"
-        f"🔄 Total users: {total_users}\n"
-        f"✅ Successfully sent to: {success_count} users\n"
-        f"❌ Failed to send to: {failed_count} users"
-    )
-
-    # Log the broadcast
-    broadcast_type = "photo" if broadcast_photo else "video" if broadcast_video else "document" if broadcast_document else "text"
-    logging.info(
-        f"Broadcast by Admin ID {ADMIN_ID}: "
-        f"Type: {broadcast_type}, "
-        f"Message: '{broadcast_message or 'Media with no caption'}', "
-        f"Buttons: {broadcast_reply_markup is not None}, "
-        f"Total: {total_users}, Success: {success_count}, Failed: {failed_count}"
-    )
+    if SCALE_OUT:
+        # The worker holding the broadcasts lease picks it up within BROADCAST_POLL_INTERVAL
+        return
+    start_broadcast_job(client, doc)
 
 # User count command handler
 @app.on_message(filters.command("usercount") & filters.user(ADMIN_ID))
+@instrumented("usercount")
 async def user_count(client: Client, message: Message):
     if message.from_user.id != ADMIN_ID:
         await message.reply("🚫 You are not authorized to use this command.")
         return
 
     try:
-        total_users = users.count_documents({})
+        total_users = await run_db(users.count_documents, {})
         await message.reply(f"📊 Total users in database: {total_users}")
     except Exception as e:
         logging.error(f"Error fetching user count: {e}")
         await message.reply("❌ Error accessing user database.")
 
+# Dead user pruning: probes every user with a chat action, which fails the
+# same way a send would for users who blocked the bot or deleted their account
+prune_progress = {"running": False, "checked": 0, "dead": 0, "total": 0}
+
+async def prune_dead_users(client: Client, status_message: Message):
+    limiter = TokenBucket(BROADCAST_RATE)
+    slots = asyncio.Semaphore(BROADCAST_WORKERS)
+    prune_progress.update(running=True, checked=0, dead=0)
+
+    async def probe(user_id):
+        async with slots:
+            for _ in range(5):
+                await limiter.acquire()
+                try:
+                    with raising_flood_waits():
+                        await client.send_chat_action(user_id, ChatAction.TYPING)
+                    limiter.success()
+                except FloodWait as e:
+                    limiter.flood_wait(e.value)
+                    continue
+                except DEAD_USER_ERRORS:
+                    dead_users.add(user_id)
+                    prune_progress["dead"] += 1
+                except Exception as e:
+                    logging.debug(f"Prune probe failed for user {user_id}: {e}")
+                break
+            prune_progress["checked"] += 1
+
+    try:
+        prune_progress["total"] = await run_db(users.count_documents, {})
+        last_user_id = None
+        while True:
+            query = {"user_id": {"$gt": last_user_id}} if last_user_id is not None else {}
+            chunk = await run_db(
+                lambda: [u["user_id"] for u in users.find(query, {"user_id": 1}).sort("user_id", 1).limit(BROADCAST_CHUNK)]
+            )
+            if not chunk:
+                break
+            await asyncio.gather(*(probe(user_id) for user_id in chunk))
+            await dead_users.flush()
+            last_user_id = chunk[-1]
+        await status_message.edit(
+            f"🧹 Prune completed!\n"
+            f"🔍 Checked: {prune_progress['checked']} users\n"
+            f"🗑 Removed: {prune_progress['dead']} dead users"
+        )
+    except Exception as e:
+        logging.error(f"Prune job failed: {e}")
+        await status_message.edit(f"❌ Prune failed after checking {prune_progress['checked']} users.")
+    finally:
+        prune_progress["running"] = False
+
+@app.on_message(filters.command("prune") & filters.user(ADMIN_ID))
+@instrumented("prune")
+async def prune_command(client: Client, message: Message):
+    if prune_progress["running"]:
+        await message.reply(
+            f"🧹 Prune in progress: {prune_progress['checked']}/{prune_progress['total']} checked, "
+            f"{prune_progress['dead']} dead users found."
+        )
+        return
+
+    # Both would spend the same Telegram send budget with separate limiters
+    if active_broadcasts or (SCALE_OUT and await unfinished_broadcast()):
+        await message.reply("⚠️ A broadcast is running. Try /prune again once it has finished.")
+        return
+
+    status_message = await message.reply(
+        "🧹 Checking all users for blocked or deleted accounts...\n"
+        "Each user will briefly see \"typing…\" in their chat with the bot."
+    )
+    asyncio.create_task(prune_dead_users(client, status_message))
+
 # Callback query handler
 @app.on_callback_query()
+@instrumented("callback")
 async def handle_callback(client, callback_query):
     user_id = callback_query.from_user.id
     data = callback_query.data
@@ -333,9 +2089,7 @@ async def handle_callback(client, callback_query):
         if user_id != ADMIN_ID:
             await callback_query.answer("🚫 You are not authorized to check API status.", show_alert=True)
             return
-        check_site_connection()
-        status = "✅ Connected" if site_connected else "❌ Not Connected"
-        await callback_query.message.reply(f"🔍 API connection status: {status}")
+        await callback_query.message.reply(f"🔍 API connection status: {health.describe('site')}")
         return
 
     if data == "db_status":
@@ -343,33 +2097,36 @@ async def handle_callback(client, callback_query):
             await callback_query.answer("🚫 You are not authorized to check DB status.", show_alert=True)
             return
         try:
-            mongo.server_info()
-            await callback_query.message.reply("✅ Database is connected.")
+            await run_db(mongo.server_info)
+            missing = await run_db(check_indexes)
+            indexes = f"⚠️ Missing indexes: {', '.join(missing)}" if missing else "✅ All indexes present."
+            await callback_query.message.reply(f"✅ Database is connected.\n{indexes}")
         except Exception as e:
             await callback_query.message.reply(f"❌ Database error: {str(e)}")
         return
 
-    user_id = callback_query.from_user.id
-    data = search_results.get(user_id)
-    if not data:
-        await callback_query.answer("No search data found.", show_alert=True)
+    if not data.startswith("pg:"):
+        # Buttons from before pagination state moved into callback_data
+        await callback_query.answer("⌛ This search has expired. Please search again.", show_alert=True)
         return
 
-    current_index = data.get("current_index", 0)
-    if callback_query.data == "next":
-        current_index += 5
-    elif callback_query.data == "prev":
-        current_index -= 5
-    else:
+    try:
+        _, token, index = data.split(":")
+        index = int(index)
+    except ValueError:
         await callback_query.answer("Invalid action.", show_alert=True)
         return
 
-    search_results[user_id]["current_index"] = current_index
-    await callback_query.message.delete()
-    await send_result(client, callback_query.message.chat.id, user_id, current_index, callback_query.message)
+    error = await edit_result(client, callback_query.message, token, index)
+    if error:
+        await callback_query.answer(error, show_alert=True)
+    else:
+        # Stops the button's loading spinner
+        await callback_query.answer()
 
 # Admin-only /api command
 @app.on_message(filters.command("api"))
+@instrumented("api")
 async def api_command(client: Client, message: Message):
     user_id = message.from_user.id
     user_name = message.from_user.first_name
@@ -382,13 +2139,157 @@ async def api_command(client: Client, message: Message):
         )
         return
 
-    check_site_connection()
-    status = "✅ Connected" if site_connected else "❌ Not Connected"
-    await message.reply(f"🔍 Site connection status: {status}")
+    await message.reply(
+        f"🔍 Site connection status: {health.describe('site')}\n\n"
+        f"🗄 Database status: {health.describe('mongo')}"
+    )
+
+# Admin-only TMDb cache statistics
+@app.on_message(filters.command("cachestats") & filters.user(ADMIN_ID))
+@instrumented("cachestats")
+async def cache_stats_command(client: Client, message: Message):
+    lookups = sum(cache_stats.values())
+    hit_rate = (cache_stats["memory_hits"] + cache_stats["mongo_hits"]) / lookups * 100 if lookups else 0
+    await message.reply(
+        f"🗃 TMDb cache\n"
+        f"🧠 Memory hits: {cache_stats['memory_hits']}\n"
+        f"💾 Mongo hits: {cache_stats['mongo_hits']}\n"
+        f"🌐 Misses: {cache_stats['misses']}\n"
+        f"📈 Hit rate: {hit_rate:.1f}%\n"
+        f"📦 Entries in memory: {len(tmdb_cache)}/{tmdb_cache.maxsize}\n"
+        f"🔗 Coalesced lookups: {tmdb_flights.stats['coalesced']} "
+        f"(sharing {tmdb_flights.stats['calls']} loads)\n"
+        f"🖼 Posters: {poster_stats['reused']} reused, {poster_stats['uploaded']} fetched by URL, "
+        f"{poster_stats['stale']} stale ({len(poster_file_cache)} known)"
+    )
+
+# Admin-only latency and error summary
+def format_stats():
+    """Per-series call counts and p50/p95 bucket bounds, with error totals."""
+    series = {}
+    for (name, labels), histogram in list(metrics.histograms.items()):
+        outcome = dict(labels).get("outcome")
+        key = (name, ", ".join(str(v) for k, v in labels if k != "outcome"))
+        merged = series.setdefault(key, [Histogram(), 0])
+        merged[0].counts = [a + b for a, b in zip(merged[0].counts, histogram.counts)]
+        merged[0].count += histogram.count
+        merged[0].sum += histogram.sum
+        if outcome == "error":
+            merged[1] += histogram.count
+
+    def ms(bound):
+        return "∞" if bound == float("inf") else f"{bound * 1000:.0f}ms"
+
+    uptime = int(time.time() - metrics.started)
+    lines = [f"📊 Bot stats (up {uptime // 3600}h {uptime % 3600 // 60}m)", "", "⏱ Calls, p50 / p95, avg:"]
+    for (name, label), (histogram, errors) in sorted(series.items()):
+        line = (
+            f"• {name.replace('_seconds', '')} {label}: {histogram.count}, "
+            f"≤{ms(histogram.quantile(0.5))} / ≤{ms(histogram.quantile(0.95))}, "
+            f"{histogram.sum / histogram.count * 1000:.0f}ms"
+        )
+        if errors:
+            line += f" ❗{errors} failed"
+        lines.append(line)
+    flood_waits = sum(v for (name, _), v in metrics.counters.items() if name == "flood_waits_total")
+    answers = {dict(labels)["source"]: v for (name, labels), v in metrics.counters.items() if name == "search_answers_total"}
+    lines.append("")
+    lines.append(f"⏳ FloodWaits: {flood_waits}")
+    startup = ", ".join(
+        f"{label} {metrics.gauges[name]:.1f}s" for label, name in (
+            ("Telegram up", "startup_telegram_seconds"),
+            ("first reply", "startup_first_reply_seconds"),
+            ("fully ready", "startup_ready_seconds"),
+        ) if name in metrics.gauges
+    )
+    lines.append(f"🚀 Startup: {startup or 'still starting'}")
+    superseded = metrics.counters["searches_superseded_total", ()]
+    lines.append(
+        f"🚦 Admission: {search_limiter.stats['limited']} rate-limited, {superseded} superseded, "
+        f"{tmdb_gate.stats['queued']} TMDb calls queued, {tmdb_gate.stats['shed']} shed "
+        f"(background: {tmdb_background_gate.stats['shed']} shed)"
+    )
+    lines.append(f"🔎 Searches answered: {answers.get('title_index', 0)} from the title index, {answers.get('tmdb', 0)} from TMDb")
+    lookups = sum(cache_stats.values())
+    hits = cache_stats["memory_hits"] + cache_stats["mongo_hits"]
+    lines.append(f"🗃 TMDb cache hit rate: {hits / lookups * 100 if lookups else 0:.1f}% of {lookups}")
+    text = "\n".join(lines)
+    return text if len(text) <= 4000 else text[:4000] + "\n…"
+
+@app.on_message(filters.command("stats") & filters.user(ADMIN_ID))
+@instrumented("stats")
+async def stats_command(client: Client, message: Message):
+    await message.reply(format_stats())
+
+# Search admission control: per-user rate limits, and at most one search in
+# flight per user, so a spamming user can't crowd out everyone else. With
+# SCALE_OUT a user's updates spread over the workers and each keeps its own
+# buckets, so a user can reach up to SEARCH_RATE per worker
+SEARCH_RATE = float(os.getenv("SEARCH_RATE", 0.5))  # sustained searches per second per user
+SEARCH_BURST = int(os.getenv("SEARCH_BURST", 5))
+RATE_LIMIT_NOTICE_INTERVAL = 30  # seconds between "slow down" replies to the same user
+
+class UserRateLimiter:
+    """Per-user token buckets kept as a single float per user (GCRA).
+
+    A user's entry is the time their bucket is full again; entries already in
+    the past say nothing a missing entry wouldn't, so they are swept out.
+    """
+
+    def __init__(self, rate, burst, sweep_interval=60):
+        self.interval = 1 / rate
+        self.tolerance = (burst - 1) * self.interval
+        self.full_at = {}
+        self.warned_until = {}
+        self.sweep_interval = sweep_interval
+        self.next_sweep = time.monotonic() + sweep_interval
+        self.stats = {"allowed": 0, "limited": 0}
+
+    def acquire(self, user_id):
+        """Take a token: 0 if allowed, otherwise the seconds until one is available."""
+        now = time.monotonic()
+        if now >= self.next_sweep:
+            self.sweep(now)
+        full_at = max(self.full_at.get(user_id, now), now)
+        wait = full_at - now - self.tolerance
+        if wait > 0:
+            self.stats["limited"] += 1
+            return wait
+        self.full_at[user_id] = full_at + self.interval
+        self.stats["allowed"] += 1
+        return 0
+
+    def should_warn(self, user_id):
+        now = time.monotonic()
+        if self.warned_until.get(user_id, 0) > now:
+            return False
+        self.warned_until[user_id] = now + RATE_LIMIT_NOTICE_INTERVAL
+        return True
+
+    def sweep(self, now):
+        self.full_at = {user_id: t for user_id, t in self.full_at.items() if t > now}
+        self.warned_until = {user_id: t for user_id, t in self.warned_until.items() if t > now}
+        self.next_sweep = now + self.sweep_interval
+
+search_limiter = UserRateLimiter(SEARCH_RATE, SEARCH_BURST)
+inflight_searches = {}  # user_id -> task running that user's latest search
+page_streams = {}  # user_id -> task fetching later pages of that user's latest results
+
+def stream_done(user_id, task):
+    if page_streams.get(user_id) is task:
+        del page_streams[user_id]
+    if not task.cancelled() and task.exception():
+        logging.warning(f"Streaming result pages for user {user_id} failed: {task.exception()}")
+metrics.collect("search_admission_total", lambda: search_limiter.stats)
 
 # Search handler
-@app.on_message(filters.text & ~filters.command(["start", "api", "broadcast", "usercount"]))
+@app.on_message(filters.text & ~filters.command(["start", "api", "broadcast", "usercount", "cachestats", "prune", "stats", "trending"]))
+@instrumented("search")
 async def search_movie_or_tv(client, message: Message):
+    if starting_up():
+        await message.reply("⏳ The bot is starting up. Please try again in a few seconds.")
+        return
+
     if not site_connected:
         await message.reply("🚫 The bot is currently not connected to the site. Please try again later.")
         return
@@ -399,54 +2300,63 @@ async def search_movie_or_tv(client, message: Message):
     username = user.username or user.first_name
 
     # Store user during search
-    try:
-        users.update_one(
-            {"user_id": user_id},
-            {
-                "$set": {
-                    "username": username,
-                    "first_name": user.first_name,
-                    "last_seen": time.time()
-                }
-            },
-            upsert=True
-        )
-    except Exception as e:
-        logging.error(f"Error storing user {user_id} in MongoDB: {e}")
+    user_registry.touch(user)
 
-    await client.send_message(ADMIN_ID, f"🧐 User `{username}` searched for: `{query}`")
-
-    headers = {
-        "User-Agent": "Mozilla/5.0",
-        "Content-Type": "application/json",
-        "Accept": "application/json"
-    }
+    retry_after = search_limiter.acquire(user_id)
+    if retry_after:
+        if search_limiter.should_warn(user_id):
+            await message.reply(f"🐢 You're searching too fast. Please wait {int(retry_after) + 1}s and try again.")
+        return
 
-    try:
-        requests.post(
-            "https://api.hindicinema.xyz/api/log-search",
-            json={"user_id": user_id, "username": username, "query": query},
-            headers=headers,
-            timeout=10
-        )
-    except Exception as e:
-        logging.warning(f"Failed to send search query to Laravel site: {e}")
+    analytics.track_search(user_id, username, query)
 
     loading_msg = await message.reply("**AI is finding your result...**")
 
-    year_match = re.search(r'\b(\d{4})\b', query)
-    search_year = year_match.group(1) if year_match else None
-    search_query = re.sub(r'\b\d{4}\b', '', query).strip().lower()
+    # A newer query from the same user replaces the search still running.
+    # The search runs in its own task so cancelling it never touches the
+    # dispatcher's worker running this handler.
+    previous = inflight_searches.get(user_id)
+    if previous and not previous.done():
+        previous.cancel()
+    stream = page_streams.pop(user_id, None)
+    if stream:
+        stream.cancel()
+    task = asyncio.create_task(run_search(client, message, query, loading_msg))
+    inflight_searches[user_id] = task
+    try:
+        await task
+    except asyncio.CancelledError:
+        if inflight_searches.get(user_id) is task:
+            raise
+        metrics.inc("searches_superseded_total")
+        try:
+            await loading_msg.delete()
+        except Exception as e:
+            logging.debug(f"Could not remove superseded search message: {e}")
+    finally:
+        if inflight_searches.get(user_id) is task:
+            del inflight_searches[user_id]
+
+async def run_search(client, message: Message, query, loading_msg):
+    # Checked before the year is stripped, so "new 2019" stays a title search
+    trending = render_trending() if normalize_query(query) in EMPTY_INTENT_QUERIES else None
+    if trending:
+        text, reply_markup = trending
+        await loading_msg.edit(text, reply_markup=reply_markup, disable_web_page_preview=True)
+        return
 
+    search_query, search_year = parse_query(query)
     if not search_query:
         await loading_msg.edit("⚠️ Please provide a valid movie or TV show name.")
         return
 
     try:
-        movie_results = movie.search(search_query)
-        tv_results = tv.search(search_query)
-        results = movie_results + tv_results
-    except TMDbException as e:
+        results, remaining = await search_titles(search_query, search_year)
+    except TMDbOverloaded as e:
+        logging.warning(f"Shed search for '{search_query}': {e}")
+        await loading_msg.edit("🚦 The bot is very busy right now. Please try again in a few seconds.")
+        return
+    except TMDbError as e:
         logging.error(f"TMDb API error: {e}")
         await loading_msg.edit(f"⚠️ TMDB API error: {e}. Please try again later.")
         return
@@ -459,131 +2369,535 @@ async def search_movie_or_tv(client, message: Message):
         await loading_msg.edit("😕 No matching results found.")
         return
 
-    filtered_results = []
-    result_types = []
-    if search_year:
-        for result in results:
-            release_date = getattr(result, 'release_date', None) or getattr(result, 'first_air_date', None)
-            if release_date:
-                result_year = release_date[:4]
-                if result_year == search_year:
-                    filtered_results.append(result)
-                    result_types.append("movie" if result in movie_results else "tv")
-    else:
-        filtered_results = results
-        result_types = ["movie" if r in movie_results else "tv" for r in results]
+    filtered_results = [r for r in results if r["year"] == search_year] if search_year else results
+    year_filter = search_year
 
-    if not filtered_results and results and search_year:
+    if not filtered_results and search_year:
         await loading_msg.edit(
             f"⚠️ No results found for '{search_query}' in {search_year}. Showing closest matches instead:"
         )
         filtered_results = results
-        result_types = ["movie" if r in movie_results else "tv" for r in results]
-
-    if not filtered_results:
-        await loading_msg.edit("😕 No matching results found.")
-        return
+        year_filter = None
+
+    token = secrets.token_urlsafe(6)
+    await sessions.put(token, SearchSession(filtered_results))
+
+    if remaining and len(filtered_results) <= PAGE_SIZE:
+        # Next is decided at first render, so a page this short would strand
+        # anything streamed in later; fetch the rest before showing it
+        await stream_remaining_pages(token, search_query, remaining, year_filter)
+        remaining = []
+
+    await send_result(client, message.chat.id, token, 0, loading_msg)
+    if remaining:
+        # One stream per user, cancelled by their next search like the search itself
+        with background_tmdb():
+            stream = asyncio.create_task(stream_remaining_pages(token, search_query, remaining, year_filter))
+        page_streams[message.from_user.id] = stream
+        stream.add_done_callback(functools.partial(stream_done, message.from_user.id))
+
+# Inline mode (@DD_search_movie_bot titanic): answered from the same
+# indexed/cached search path, with per-prefix results cached so each
+# keystroke of a growing query doesn't trigger a new TMDb search
+INLINE_MIN_QUERY = 3
+INLINE_RESULTS = 20
+INLINE_CACHE_TIME = 300  # seconds Telegram may cache an answer
+inline_cache = TTLCache(10000, 600)
+
+def inline_cache_key(search_query, search_year):
+    return f"{search_year or ''}|{normalize_query(search_query)}"
+
+async def inline_records(search_query, search_year):
+    key = inline_cache_key(search_query, search_year)
+    records = inline_cache.get(key)
+    if records is not None:
+        return records
+
+    # A shorter cached prefix whose results already contain the whole query
+    # (e.g. "titani" after "titan") is good enough while the user is typing
+    wanted = title_key(search_query)
+    for end in range(len(search_query) - 1, INLINE_MIN_QUERY - 1, -1):
+        shorter = inline_cache.get(inline_cache_key(search_query[:end], search_year))
+        if shorter:
+            narrowed = [r for r in shorter if wanted in title_key(r["title"] or "")]
+            if len(narrowed) >= PAGE_SIZE:
+                inline_cache.set(key, narrowed)
+                return narrowed
+            break
 
-    result_ids = [r.id for r in filtered_results]
-    search_results[user_id] = {
-        "results": result_ids,
-        "types": result_types,
-        "current_index": 0,
-        "timestamp": time.time()
-    }
+    records, _ = await search_titles(search_query, search_year)
+    if search_year:
+        records = [r for r in records if r["year"] == search_year] or records
+    records = [r for r in records if r["title"]][:INLINE_RESULTS]
+    inline_cache.set(key, records)
+    return records
+
+def inline_result(record):
+    link = f"https://hindicinema.xyz/best/result/x/{record['id']}/{record['type']}"
+    genres = ", ".join(genre_names[g] for g in record["genre_ids"] if g in genre_names) or "Unknown"
+    caption = f"**{record['title']}** ({record['year']})\n\n**Genres:** {genres}"
+    reply_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🎬 Watch on hindicinema.xyz", url=link)]])
+    result_id = f"{record['type']}:{record['id']}"
+    if record["poster"]:
+        poster_url = f"{POSTER_BASE_URL}{record['poster']}"
+        # Only the in-memory map is consulted: a result list is built per keystroke
+        file_id = poster_file_cache.get(poster_url)
+        if file_id:
+            return InlineQueryResultCachedPhoto(
+                photo_file_id=file_id,
+                id=result_id,
+                title=f"{record['title']} ({record['year']})",
+                description=genres,
+                caption=caption,
+                reply_markup=reply_markup
+            )
+        return InlineQueryResultPhoto(
+            photo_url=poster_url,
+            thumb_url=f"https://image.tmdb.org/t/p/w92{record['poster']}",
+            id=result_id,
+            title=f"{record['title']} ({record['year']})",
+            description=genres,
+            caption=caption,
+            reply_markup=reply_markup
+        )
+    return InlineQueryResultArticle(
+        title=f"{record['title']} ({record['year']})",
+        input_message_content=InputTextMessageContent(caption),
+        id=result_id,
+        url=link,
+        description=genres,
+        reply_markup=reply_markup
+    )
 
-    await send_result(client, message.chat.id, user_id, 0, loading_msg)
+@app.on_inline_query()
+@instrumented("inline")
+async def inline_search(client, inline_query):
+    user_registry.touch(inline_query.from_user)
+    search_query, search_year = parse_query(inline_query.query)
+
+    trending = trending_snapshot["lists"].get("trending")
+    if site_connected and len(search_query) < INLINE_MIN_QUERY and trending:
+        # Nothing typed yet: suggest what's trending
+        await inline_query.answer(
+            [inline_result(r) for r in trending[:INLINE_RESULTS]],
+            cache_time=INLINE_CACHE_TIME,
+            switch_pm_text="Type a movie or series name",
+            switch_pm_parameter="inline"
+        )
+        return
 
-async def send_result(client, chat_id, user_id, index, loading_msg):
-    data = search_results.get(user_id)
-    if not data:
-        await client.send_message(chat_id, "No search data found.")
+    if not site_connected or len(search_query) < INLINE_MIN_QUERY:
+        await inline_query.answer(
+            [],
+            cache_time=5,
+            switch_pm_text="Type a movie or series name" if site_connected else "Bot is offline, try again later",
+            switch_pm_parameter="inline"
+        )
         return
 
-    result_ids = data.get("results", [])
-    result_types = data.get("types", [])
-    if index < 0 or index >= len(result_ids):
-        await client.send_message(chat_id, "No more results.")
+    try:
+        records = await inline_records(search_query, search_year)
+    except Exception as e:
+        logging.error(f"Inline search failed for query '{search_query}': {e}")
+        await inline_query.answer([], cache_time=5)
         return
 
-    buttons = []
-    for i in range(5):
-        if index + i >= len(result_ids):
-            break
+    await inline_query.answer([inline_result(r) for r in records], cache_time=INLINE_CACHE_TIME)
 
-        res_id = result_ids[index + i]
-        res_type = result_types[index + i]
+# Result pages: up to PAGE_SIZE items rendered from the stored search records
+PAGE_SIZE = 5
+DETAILS_DEADLINE = float(os.getenv("DETAILS_DEADLINE", 4))
+POSTER_BASE_URL = "https://image.tmdb.org/t/p/w500"
+
+# TMDb genre id -> name, loaded once at startup for both movies and TV
+genre_names = {}
+
+async def load_genres():
+    """Load movie and TV genre names; returns whether both lists loaded."""
+    loaded = True
+    for media_type in ("movie", "tv"):
         try:
-            full_details = movie.details(res_id) if res_type == "movie" else tv.details(res_id)
-            title = full_details.title if res_type == "movie" else full_details.name
-            release_date = full_details.release_date if res_type == "movie" else full_details.first_air_date
-            year = release_date[:4] if release_date else "N/A"
-        except TMDbException as e:
-            logging.error(f"TMDb API error while fetching details for ID {res_id}: {e}")
-            await client.send_message(chat_id, f"⚠️ TMDB API error: {e}. Skipping this result.")
-            continue
+            data = await cached_tmdb(f"genres:{media_type}", lambda: tmdb_request(f"/genre/{media_type}/list"))
+            genre_names.update({g["id"]: g["name"] for g in data.get("genres", [])})
         except Exception as e:
-            logging.error(f"Error fetching details for ID {res_id}: {e}")
-            await client.send_message(chat_id, "⚠️ Error fetching details. Skipping this result.")
-            continue
+            logging.error(f"Failed to load {media_type} genres from TMDb: {e}")
+            loaded = False
+    logging.info(f"Loaded {len(genre_names)} TMDb genres")
+    return loaded
+
+def title_and_year(res_type, details):
+    title = details.get("title") if res_type == "movie" else details.get("name")
+    release_date = details.get("release_date") if res_type == "movie" else details.get("first_air_date")
+    return title, release_date[:4] if release_date else "N/A"
+
+def make_record(res_type, result):
+    """Compact record of a search result or details response, enough to render a page."""
+    title, year = title_and_year(res_type, result)
+    genre_ids = result.get("genre_ids") or [g["id"] for g in result.get("genres") or []]
+    return {
+        "id": result["id"],
+        "type": res_type,
+        "title": title,
+        "year": year,
+        "poster": result.get("poster_path"),
+        "genre_ids": genre_ids
+    }
+
+async def fetch_details_batch(items, deadline=DETAILS_DEADLINE):
+    """Fetch details for (type, id) pairs concurrently within one deadline.
+
+    Returns a dict mapping each pair to its details or to the exception it
+    raised; pairs still pending at the deadline are left out.
+    """
+    tasks = {asyncio.ensure_future(tmdb_details(res_type, res_id)): (res_type, res_id)
+             for res_type, res_id in dict.fromkeys(items)}
+    if not tasks:
+        return {}
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    return {tasks[task]: task.exception() or task.result() for task in done}
+
+def needs_details(record):
+    # Title index entries from the TMDb exports have neither poster nor genres
+    return not record["title"] or not (record["poster"] or record["genre_ids"])
+
+async def complete_records(records):
+    """Fill in records that lack a title, poster or genres from TMDb details.
+
+    Returns the records that could be rendered.
+    """
+    incomplete = [(r["type"], r["id"]) for r in records if needs_details(r)]
+    if not incomplete:
+        return records
+
+    details = await fetch_details_batch(incomplete)
+    complete = []
+    for record in records:
+        if needs_details(record):
+            full_details = details.get((record["type"], record["id"]))
+            if full_details is None:
+                logging.warning(f"Timed out fetching details for ID {record['id']}")
+            elif isinstance(full_details, Exception):
+                logging.error(f"Error fetching details for ID {record['id']}: {full_details}")
+            else:
+                record.update(make_record(record["type"], full_details))
+        if record["title"]:
+            complete.append(record)
+    return complete
+
+def page_callback(token, index):
+    # Session token + offset, well within Telegram's 64-byte callback_data limit
+    return f"pg:{token}:{index}"
+
+async def render_page(session, token, index):
+    """Build (caption, poster_url, reply_markup) for a page, or None if nothing could be shown."""
+    page = session.records(index, index + PAGE_SIZE)
+    shown = await complete_records(page)
+    if not shown:
+        return None
 
-        button_text = f"{title} ({year})"
-        button_url = f"https://hindicinema.xyz/best/result/x/{res_id}/{res_type.lower()}"
+    buttons = []
+    for record in shown:
+        button_text = f"{record['title']} ({record['year']})"
+        button_url = f"https://hindicinema.xyz/best/result/x/{record['id']}/{record['type']}"
         buttons.append([InlineKeyboardButton(button_text, url=button_url)])
 
     nav_buttons = []
     if index > 0:
-        nav_buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data="prev"))
-    if index + 5 < len(result_ids):
-        nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data="next"))
+        nav_buttons.append(InlineKeyboardButton("⬅️ Previous", callback_data=page_callback(token, max(index - PAGE_SIZE, 0))))
+    if index + PAGE_SIZE < len(session):
+        nav_buttons.append(InlineKeyboardButton("Next ➡️", callback_data=page_callback(token, index + PAGE_SIZE)))
     if nav_buttons:
         buttons.append(nav_buttons)
 
-    res_id = result_ids[index]
-    res_type = result_types[index]
-    try:
-        full_details = movie.details(res_id) if res_type == "movie" else tv.details(res_id)
-        title = full_details.title if res_type == "movie" else full_details.name
-        release_date = full_details.release_date if res_type == "movie" else full_details.first_air_date
-        year = release_date[:4] if release_date else "N/A"
-        genres = ", ".join([g.name for g in full_details.genres]) if full_details.genres else "Unknown"
-        poster_url = f"https://image.tmdb.org/t/p/w500{full_details.poster_path}" if full_details.poster_path else None
-    except TMDbException as e:
-        logging.error(f"TMDb API error while fetching details for ID {res_id}: {e}")
-        await loading_msg.edit(f"⚠️ TMDB API error: {e}. Cannot display this result.")
+    lead = shown[0]
+    genres = ", ".join(genre_names[g] for g in lead["genre_ids"] if g in genre_names) or "Unknown"
+    poster_url = f"{POSTER_BASE_URL}{lead['poster']}" if lead["poster"] else None
+
+    caption = f"**{lead['title']}** ({lead['year']})\n\n**Genres:** {genres}"
+    if len(shown) < len(page):
+        caption += f"\n\n⚠️ {len(page) - len(shown)} result(s) could not be loaded right now."
+    return caption, poster_url, InlineKeyboardMarkup(buttons)
+
+@instrumented("send_result")
+async def send_result(client, chat_id, token, index, loading_msg):
+    session = await sessions.get(token)
+    if not session:
+        await client.send_message(chat_id, "No search data found.")
         return
-    except Exception as e:
-        logging.error(f"Error fetching details for ID {res_id}: {e}")
-        await loading_msg.edit("⚠️ Error fetching details. Cannot display this result.")
+
+    if index < 0 or index >= len(session):
+        await client.send_message(chat_id, "No more results.")
         return
 
-    caption = f"**{title}** ({year})\n\n**Genres:** {genres}"
+    page = await render_page(session, token, index)
+    if page is None:
+        await loading_msg.edit("⚠️ Error fetching details. Cannot display these results, please try again.")
+        return
 
+    caption, poster_url, reply_markup = page
     if poster_url:
-        await client.send_photo(chat_id=chat_id, photo=poster_url, caption=caption, reply_markup=InlineKeyboardMarkup(buttons))
+        await send_poster(client, chat_id, poster_url, caption=caption, reply_markup=reply_markup)
     else:
-        await client.send_message(chat_id=chat_id, text=caption, reply_markup=InlineKeyboardMarkup(buttons))
+        await client.send_message(chat_id=chat_id, text=caption, reply_markup=reply_markup)
 
     await loading_msg.delete()
 
-async def cleanup_search_results():
+@instrumented("edit_result")
+async def edit_result(client, message, token, index):
+    """Turn an existing result message to another page in place.
+
+    Returns an error to show the user, or None on success.
+    """
+    session = await sessions.get(token)
+    if not session:
+        return "⌛ This search has expired. Please search again."
+    if index < 0 or index >= len(session):
+        return "No more results."
+
+    page = await render_page(session, token, index)
+    if page is None:
+        return "⚠️ Error fetching details. Please try again."
+
+    caption, poster_url, reply_markup = page
+    if bool(poster_url) == bool(message.photo):
+        try:
+            if poster_url:
+                await edit_poster(client, message, poster_url, caption, reply_markup)
+            else:
+                await client.edit_message_text(message.chat.id, message.id, caption, reply_markup=reply_markup)
+        except MessageNotModified:
+            # A double tap asked for the page that is already showing
+            pass
+    else:
+        # Telegram can't turn a text message into a photo or back, so replace it
+        await message.delete()
+        if poster_url:
+            await send_poster(client, message.chat.id, poster_url, caption=caption, reply_markup=reply_markup)
+        else:
+            await client.send_message(chat_id=message.chat.id, text=caption, reply_markup=reply_markup)
+    return None
+
+# Trending prefetcher: every PREFETCH_INTERVAL seconds TMDb's trending,
+# popular and now-playing lists and the most searched queries are fetched
+# ahead of demand, warming the TMDb cache, the title index and poster
+# file_ids, so hot titles never need TMDb on the request path. The lists
+# are kept as a snapshot that serves /trending, inline queries without text
+# and searches that don't name a title.
+PREFETCH_INTERVAL = int(os.getenv("PREFETCH_INTERVAL", 3600))
+PREFETCH_TOP_QUERIES = int(os.getenv("PREFETCH_TOP_QUERIES", 50))
+PREFETCH_QUERY_WINDOW = 86400  # seconds of search history the top queries are taken from
+PREFETCH_CONCURRENCY = 4  # Lists and queries warmed at once, within the background TMDb gate
+POSTER_WARM_CHAT_ID = int(os.getenv("POSTER_WARM_CHAT_ID", 0))  # Private channel to upload posters to ahead of time
+TRENDING_LISTS = (
+    # (key, heading, TMDb path, media type or None when each result carries its own)
+    ("trending", "🔥 Trending today", "/trending/all/day", None),
+    ("now_playing", "🎬 Now in cinemas", "/movie/now_playing", "movie"),
+    ("popular_movies", "🍿 Popular movies", "/movie/popular", "movie"),
+    ("popular_tv", "📺 Popular series", "/tv/popular", "tv"),
+)
+TRENDING_SHOWN = 10
+# Only phrases nobody means as a title; single words like "Hello" still search
+EMPTY_INTENT_QUERIES = {
+    "trending", "trending movies", "popular movies", "new movies", "latest movies", "new releases"
+}
+trending_snapshot = {"lists": {}, "built_at": None}
+
+async def fetch_list(path, media_type):
+    data = await tmdb_request(path)
+    by_type = {"movie": [], "tv": []}
+    records = []
+    for result in data.get("results", []):
+        res_type = media_type or result.get("media_type")
+        if res_type not in by_type:
+            continue
+        record = make_record(res_type, result)
+        if record["title"]:
+            by_type[res_type].append(result)
+            records.append(record)
+    for res_type, results in by_type.items():
+        title_index.add_results(res_type, results)
+    return records
+
+def top_queries(since, limit):
+    pipeline = [
+        {"$match": {"created_at": {"$gte": since}}},
+        {"$group": {"_id": {"$toLower": "$query"}, "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit},
+    ]
+    return [doc["_id"] for doc in searches.aggregate(pipeline)]
+
+async def warm_posters(client, urls):
+    """Make file_ids known for poster URLs, uploading to POSTER_WARM_CHAT_ID if set."""
+    for url in urls:
+        # Also pulls ids other workers stored in Mongo into memory
+        if await poster_file_id(url) or not POSTER_WARM_CHAT_ID:
+            continue
+        try:
+            message = await send_poster(client, POSTER_WARM_CHAT_ID, url, disable_notification=True)
+            await message.delete()
+        except FloodWait as e:
+            await asyncio.sleep(e.value)
+        except Exception as e:
+            logging.debug(f"Could not pre-upload poster {url}: {e}")
+        await asyncio.sleep(1)  # Uploads share the bot's Telegram rate limit with user replies
+
+async def prefetch_trending(client):
+    """Rebuild the trending snapshot and warm caches for it and the top queries."""
+    slots = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+    async def limited(coro):
+        async with slots:
+            return await coro
+
+    fetched = await asyncio.gather(
+        *(limited(fetch_list(path, media_type)) for _, _, path, media_type in TRENDING_LISTS),
+        return_exceptions=True
+    )
+    lists = {}
+    for (key, _, path, _), result in zip(TRENDING_LISTS, fetched):
+        if isinstance(result, Exception):
+            logging.warning(f"Failed to prefetch {path}: {result}")
+            result = trending_snapshot["lists"].get(key, [])
+        lists[key] = result
+    trending_snapshot.update(lists=lists, built_at=time.time())
+
+    try:
+        queries = await run_db(top_queries, time.time() - PREFETCH_QUERY_WINDOW, PREFETCH_TOP_QUERIES)
+    except Exception as e:
+        logging.warning(f"Could not load top queries: {e}")
+        queries = []
+    # Warm exactly the cache entries search_titles will ask for
+    search_queries = {parse_query(query)[0] for query in queries} - {""}
+    records = list({(r["type"], r["id"]): r for records in lists.values() for r in records}.values())
+    outcomes = await asyncio.gather(
+        *(limited(tmdb_search(media_type, query)) for query in search_queries for media_type in ("movie", "tv")),
+        *(limited(tmdb_details(r["type"], r["id"])) for r in records),
+        return_exceptions=True
+    )
+    failed = sum(isinstance(outcome, Exception) for outcome in outcomes)
+
+    await warm_posters(client, [f"{POSTER_BASE_URL}{r['poster']}" for r in records if r["poster"]])
+    logging.info(
+        f"Prefetched {len(records)} trending titles and {len(search_queries)} top queries "
+        f"({failed} of {len(outcomes)} lookups failed)"
+    )
+
+async def run_prefetcher(client):
     while True:
-        await asyncio.sleep(3600)
-        current_time = time.time()
-        for user_id in list(search_results.keys()):
-            if current_time - search_results[user_id].get("timestamp", 0) > 3600:
-                del search_results[user_id]
+        try:
+            with background_tmdb():
+                await prefetch_trending(client)
+        except Exception as e:
+            logging.error(f"Trending prefetch failed: {e}")
+        await asyncio.sleep(PREFETCH_INTERVAL)
+
+def render_trending():
+    """(text, reply_markup) for the current snapshot, or None before the first prefetch."""
+    lists = trending_snapshot["lists"]
+    if not any(lists.values()):
+        return None
+    lines = []
+    for key, heading, _, _ in TRENDING_LISTS:
+        records = lists.get(key, [])[:TRENDING_SHOWN if key == "trending" else 5]
+        if records:
+            lines.append(f"**{heading}**")
+            lines += [f"{i}. {r['title']} ({r['year']})" for i, r in enumerate(records, 1)]
+            lines.append("")
+    lines.append(f"🕒 Updated {int(time.time() - trending_snapshot['built_at']) // 60} min ago")
+    buttons = []
+    for record in lists.get("trending", [])[:TRENDING_SHOWN]:
+        button_url = f"https://hindicinema.xyz/best/result/x/{record['id']}/{record['type']}"
+        buttons.append([InlineKeyboardButton(f"{record['title']} ({record['year']})", url=button_url)])
+    return "\n".join(lines), InlineKeyboardMarkup(buttons) if buttons else None
+
+@app.on_message(filters.command("trending"))
+@instrumented("trending")
+async def trending_command(client: Client, message: Message):
+    user_registry.touch(message.from_user)
+    page = render_trending()
+    if page is None:
+        await message.reply("⏳ Trending titles are still being collected. Please try again in a minute.")
+        return
+    text, reply_markup = page
+    await message.reply(text, reply_markup=reply_markup, disable_web_page_preview=True)
+
+# Boot: Telegram starts first and the dependencies initialise concurrently in
+# the background, retrying until they are up; until then handlers answer with
+# a "starting up" reply instead of the process blocking or exiting
+BOOT_RETRY_DELAY = 5
+BOOT_RETRY_MAX_DELAY = 60
+readiness = {"mongo": False, "genres": False}
+
+async def retry_until_ready(name, init):
+    """Await init() until it returns truthy, backing off between attempts."""
+    delay = BOOT_RETRY_DELAY
+    while True:
+        try:
+            if await init():
+                break
+        except Exception as e:
+            logging.error(f"{name} not ready, retrying in {delay}s: {e}")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, BOOT_RETRY_MAX_DELAY)
+    readiness[name] = True
+    logging.info(f"✅ {name} ready after {time.monotonic() - BOOT_STARTED:.1f}s")
+
+async def init_mongo():
+    await run_db(mongo.server_info)
+    await run_db(ensure_indexes)
+    return True
+
+def mongo_available():
+    """False while Mongo is still initialising or its last health probe failed."""
+    return readiness["mongo"] and health.status.get("mongo", {}).get("ok", True)
+
+def starting_up():
+    """True until the first site probe has finished and the session store is usable."""
+    if SESSION_BACKEND == "mongo" and not readiness["mongo"]:
+        return True
+    return "site" not in health.status
+
+async def boot(client):
+    mongo_ready = asyncio.create_task(retry_until_ready("mongo", init_mongo))
+    genres_ready = asyncio.create_task(retry_until_ready("genres", load_genres))
+    await mongo_ready
+    if not SCALE_OUT:
+        asyncio.create_task(resume_broadcasts(client))
+    asyncio.create_task(run_prefetcher(client))
+    await genres_ready
+    metrics.set_gauge("startup_ready_seconds", time.monotonic() - BOOT_STARTED)
 
 if __name__ == "__main__":
     try:
-        # Check MongoDB connection
-        mongo.server_info()
-        logging.info("✅ Connected to MongoDB")
-        check_site_connection()
         app.start()
-        logging.info("✅ Bot started successfully")
-        app.loop.create_task(cleanup_search_results())
-        idle()
-        app.stop()
+        metrics.set_gauge("startup_telegram_seconds", time.monotonic() - BOOT_STARTED)
+        logging.info(f"✅ Bot started successfully in {time.monotonic() - BOOT_STARTED:.1f}s")
+        app.loop.create_task(boot(app))
+        if METRICS_PORT:
+            start_metrics_server(METRICS_HOST, METRICS_PORT)
+        app.loop.create_task(run_as_leader("health", health.run))
+        if SCALE_OUT:
+            app.loop.create_task(health.follow())
+        if TITLE_INDEX_EXPORTS:
+            app.loop.create_task(load_title_exports())
+        if SCALE_OUT:
+            app.loop.create_task(run_as_leader("broadcasts", lambda: supervise_broadcasts(app)))
+        flushers = [app.loop.create_task(user_registry.run()), app.loop.create_task(analytics.run())]
+        app.loop.create_task(run_as_leader("digests", lambda: analytics.send_digests(app)))
+        try:
+            idle()
+            app.stop()
+        finally:
+            # Stop the flushers first so the final flush also covers what they held
+            for task in flushers:
+                task.cancel()
+            app.loop.run_until_complete(asyncio.gather(*flushers, return_exceptions=True))
+            app.loop.run_until_complete(user_registry.flush())
+            app.loop.run_until_complete(analytics.drain())
+            app.loop.run_until_complete(close_http_session())
+            db_executor.shutdown(wait=True)
     except Exception as e:
         logging.error(f"An error occurred: {e}")